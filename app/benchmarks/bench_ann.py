@@ -0,0 +1,80 @@
+"""Recall@k vs p95 latency of the hnsw and ivf ANN backends against exact search.
+
+Uses the node embeddings persisted in VECTOR_STORE_PATH (our corpus size) and a 10x corpus
+made of noisy copies of them. Queries are perturbed corpus vectors; ground truth is exact
+cosine top-k. Run from the `app/` directory (the vector store must already be built):
+
+    python -m benchmarks.bench_ann [--queries N] [--top-k K]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from config import settings
+from services.ann_index import AnnIndex, normalize_embeddings
+
+EF_SEARCH = [16, 32, 64, 128, 256]
+NPROBE = [1, 4, 16, 64]
+
+
+def load_embeddings() -> np.ndarray:
+    with open(os.path.join(settings.VECTOR_STORE_PATH, "default__vector_store.json"), encoding="utf-8") as f:
+        embedding_dict = json.load(f)["embedding_dict"]
+    return normalize_embeddings(np.asarray(list(embedding_dict.values()), dtype=np.float32))
+
+
+def noisy_copies(vectors: np.ndarray, copies: int, scale: float, rng: np.random.Generator) -> np.ndarray:
+    noise = rng.normal(0, scale / np.sqrt(vectors.shape[1]), size=(copies * len(vectors), vectors.shape[1]))
+    return normalize_embeddings(np.tile(vectors, (copies, 1)) + noise.astype(np.float32))
+
+
+def measure(search, queries: np.ndarray, truth: np.ndarray, top_k: int) -> tuple:
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(found) & set(expected))
+    return hits / truth.size, float(np.percentile(latencies, 95))
+
+
+def bench_corpus(name: str, vectors: np.ndarray, queries: np.ndarray, top_k: int):
+    node_ids = [str(i) for i in range(len(vectors))]
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :top_k]
+    print(f"\n{name}: {len(vectors)} vectors, dim {vectors.shape[1]}, top_k={top_k}")
+    print(f"{'backend':>8} | {'param':>12} | {'recall@k':>8} | {'p95 ms':>7}")
+
+    exact = lambda query: np.argpartition(-(vectors @ query), top_k)[:top_k]
+    recall, p95 = measure(exact, queries, truth, top_k)
+    print(f"{'exact':>8} | {'-':>12} | {recall:>8.3f} | {p95:>7.3f}")
+
+    for backend, params, param_name in (("hnsw", EF_SEARCH, "ef_search"), ("ivf", NPROBE, "nprobe")):
+        start = time.perf_counter()
+        ann_index = AnnIndex.build(vectors, node_ids, backend)
+        build_ms = (time.perf_counter() - start) * 1000
+        print(f"{backend:>8} | {'built in':>12} | {'':>8} | {build_ms:>7.0f}")
+        for value in params:
+            ann_index.set_search_params(**{param_name: value})
+            search = lambda query: [int(node_id) for node_id, _ in ann_index.search(query, top_k)]
+            recall, p95 = measure(search, queries, truth, top_k)
+            print(f"{backend:>8} | {f'{param_name}={value}':>12} | {recall:>8.3f} | {p95:>7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=settings.SIMILARITY_TOP_K)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = load_embeddings()
+    queries = noisy_copies(corpus[rng.choice(len(corpus), args.queries)], 1, 0.5, rng)
+    bench_corpus("corpus", corpus, queries, args.top_k)
+    bench_corpus("10x corpus", np.concatenate([corpus, noisy_copies(corpus, 9, 0.3, rng)]), queries, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Throughput of ChatBot.ask_batch (/ask/batch) vs the same questions sent as concurrent /ask calls.
+
+Both paths run in this process with the configured model and vector store, on an InferenceExecutor
+and scheduler sized from the INFERENCE_* and GENERATION_* settings as the server uses them; the
+/ask calls come from INFERENCE_WORKERS request threads. questions/s is divided by the cores the
+executor uses (workers x intra-op threads) to give a per-core figure. Run from the `app/`
+directory (vector store and model must already be set up):
+
+    python -m benchmarks.bench_ask_batch [--questions 64] [--batch-size 8]
+"""
+import argparse
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from config import settings
+from models.chatbot_model import ChatBot
+from models.generation_control import GenerationControl
+from models.query_engine_model import QueryEngine
+from services.inference_executor import InferenceExecutor
+from services.vector_service import build_or_load_vector_store
+
+QUESTIONS = [
+    "Como gerar um código promocional?",
+    "Qual tabela guarda os códigos promocionais?",
+    "Como configurar as tarifas de um hotel no PMS?",
+    "O que fazer quando a API de reservas retorna erro 500?",
+    "Como cancelar uma reserva no CRS?",
+    "Onde ficam as imagens dos hotéis?",
+    "Como integrar o POS com o PMS?",
+    "Como exportar o relatório de ocupação?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=settings.ASK_BATCH_SIZE)
+    args = parser.parse_args()
+
+    vector_index = build_or_load_vector_store(
+        settings.MARKDOWN_DOCS_PATH, settings.VECTOR_STORE_PATH, settings.EMBEDDING_MODEL_NAME,
+        query_embedding_batch_size=1
+    )
+    executor = InferenceExecutor(
+        workers=settings.INFERENCE_WORKERS,
+        intra_op_threads=settings.INFERENCE_INTRA_OP_THREADS,
+        inter_op_threads=settings.INFERENCE_INTER_OP_THREADS
+    )
+    chatbot = ChatBot(
+        query_engine=QueryEngine(vector_index, similarity_top_k=settings.SIMILARITY_TOP_K),
+        model_path=settings.MODEL_SAVE_PATH,
+        tokenizer_path=settings.MODEL_SAVE_PATH,
+        device=settings.DEVICE,
+        model_torch_dtype=torch.float32 if settings.MODEL_TORCH_DTYPE == "torch.float32" else torch.float16,
+        max_new_tokens=settings.MAX_NEW_TOKENS,
+        temperature=settings.TEMPERATURE,
+        max_batch_size=settings.GENERATION_MAX_BATCH_SIZE,
+        batch_wait_ms=settings.GENERATION_BATCH_WAIT_MS,
+        inference_executor=executor,
+    )
+    # Numbered so neither path is served from a cache
+    questions = [f"{question} ({n})" for n, question in zip(range(args.questions), itertools.cycle(QUESTIONS))]
+    chatbot.ask(questions[0], control=GenerationControl())  # warm-up
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=executor.workers) as request_threads:
+        list(request_threads.map(lambda question: chatbot.ask(question, control=GenerationControl()), questions))
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first_result_s = None
+    for _ in chatbot.ask_batch(questions, batch_size=args.batch_size):
+        if first_result_s is None:
+            first_result_s = time.perf_counter() - start
+    batch_s = time.perf_counter() - start
+
+    executor.shutdown()
+
+    cores = executor.workers * executor.intra_op_threads
+    print(f"{args.questions} questions, batch size {args.batch_size}, "
+          f"{executor.workers} workers x {executor.intra_op_threads} intra-op threads")
+    print(f"{'path':>10} | {'total s':>8} | {'q/s':>6} | {'q/s/core':>8}")
+    for label, seconds in (("/ask", single_s), ("batch", batch_s)):
+        print(f"{label:>10} | {seconds:>8.1f} | {args.questions / seconds:>6.2f} | {args.questions / seconds / cores:>8.3f}")
+    print(f"\nBatch path {single_s / batch_s:.1f}x the throughput; first result after {first_result_s:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
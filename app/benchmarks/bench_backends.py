@@ -0,0 +1,69 @@
+"""Parity and per-token latency of the transformers and onnxruntime backends on CPU.
+
+Parity: greedy decoding must produce the same tokens on both backends and the logits of
+the prompt forward pass must agree within a tolerance. The process exits non-zero when
+parity fails. Run from the `app/` directory:
+
+    python -m benchmarks.bench_backends
+"""
+import sys
+import time
+
+import torch
+from transformers import AutoTokenizer
+
+from config import settings
+from utils.model_loader import load_causal_lm
+
+PROMPTS = [
+    "Pergunta do Usuário:\nO que é o PMS?\n\nResposta Assistente:",
+    "Pergunta do Usuário:\nComo gerar um código promocional?\n\nResposta Assistente:",
+    "Pergunta do Usuário:\nQual tabela guarda as imagens dos hotéis?\n\nResposta Assistente:",
+]
+NEW_TOKENS = 32
+LOGITS_TOLERANCE = 1e-2
+
+
+def per_token_latency_ms(model, inputs, pad_token_id) -> tuple[float, torch.Tensor]:
+    start = time.perf_counter()
+    outputs = model.generate(**inputs, max_new_tokens=NEW_TOKENS, min_new_tokens=NEW_TOKENS, do_sample=False,
+                             pad_token_id=pad_token_id)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / NEW_TOKENS, outputs[0, inputs["input_ids"].shape[1]:]
+
+
+def main():
+    tokenizer = AutoTokenizer.from_pretrained(settings.MODEL_SAVE_PATH)
+    models = {
+        backend: load_causal_lm(settings.MODEL_SAVE_PATH, "cpu", torch.float32, backend=backend)
+        for backend in ("transformers", "onnxruntime")
+    }
+
+    parity_ok = True
+    latencies = {backend: [] for backend in models}
+    print(f"{'prompt':>6} | {'max |dlogits|':>13} | {'tokens equal':>12} | {'eager ms/tok':>12} | {'ort ms/tok':>10}")
+    for i, prompt in enumerate(PROMPTS):
+        inputs = tokenizer(prompt, return_tensors="pt")
+        with torch.no_grad():
+            logits = {backend: model(**inputs).logits for backend, model in models.items()}
+            generated = {}
+            for backend, model in models.items():
+                model.generate(**inputs, max_new_tokens=2, do_sample=False, pad_token_id=tokenizer.eos_token_id)  # warm-up
+                latency, generated[backend] = per_token_latency_ms(model, inputs, tokenizer.eos_token_id)
+                latencies[backend].append(latency)
+
+        max_diff = (logits["transformers"] - logits["onnxruntime"]).abs().max().item()
+        tokens_equal = torch.equal(generated["transformers"], generated["onnxruntime"])
+        parity_ok &= tokens_equal and max_diff <= LOGITS_TOLERANCE
+        print(f"{i:>6} | {max_diff:>13.2e} | {str(tokens_equal):>12} | "
+              f"{latencies['transformers'][-1]:>12.1f} | {latencies['onnxruntime'][-1]:>10.1f}")
+
+    eager = sum(latencies["transformers"]) / len(PROMPTS)
+    ort = sum(latencies["onnxruntime"]) / len(PROMPTS)
+    print(f"\nMean ms/token: transformers {eager:.1f}, onnxruntime {ort:.1f} ({eager / ort:.2f}x)")
+    print(f"Parity: {'OK' if parity_ok else 'FAILED'}")
+    sys.exit(0 if parity_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Throughput of per-request generation vs. the batching GenerationScheduler.
+
+Run from the `app/` directory (the model must already be at MODEL_SAVE_PATH):
+
+    python -m benchmarks.bench_generation
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from config import settings
+from models.chatbot_model import ChatBot, CHAT_INSTRUCTIONS
+from models.generation_scheduler import GenerationScheduler
+
+CONCURRENCY_LEVELS = [1, 4, 16, 64]
+CONTEXT = ["O PMS é o sistema de gestão de propriedades usado pelos hotéis."]
+QUESTION = "O que é o PMS? (#{i})"
+
+
+def run(chatbot: ChatBot, generate, concurrency: int) -> tuple[float, int]:
+    prompts = [(CHAT_INSTRUCTIONS, QUESTION.format(i=i), CONTEXT) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        answers = list(pool.map(generate, prompts))
+    elapsed = time.perf_counter() - start
+    tokens = sum(len(chatbot.tokenizer.encode(answer)) for answer in answers)
+    return elapsed, tokens
+
+
+def main():
+    torch_dtype = torch.float32 if settings.MODEL_TORCH_DTYPE == "torch.float32" else torch.float16
+    chatbot = ChatBot(
+        query_engine=None,
+        model_path=settings.MODEL_SAVE_PATH,
+        tokenizer_path=settings.MODEL_SAVE_PATH,
+        device=settings.DEVICE,
+        model_torch_dtype=torch_dtype,
+        max_new_tokens=settings.MAX_NEW_TOKENS,
+        temperature=settings.TEMPERATURE,
+    )
+    scheduler = GenerationScheduler(
+        chatbot.generate_batch,
+        max_batch_size=settings.GENERATION_MAX_BATCH_SIZE,
+        max_wait_ms=settings.GENERATION_BATCH_WAIT_MS,
+    )
+
+    print(f"{'concurrency':>11} | {'per-request tok/s':>17} | {'scheduler tok/s':>15} | {'speedup':>7}")
+    for concurrency in CONCURRENCY_LEVELS:
+        baseline_s, baseline_tokens = run(chatbot, lambda p: chatbot.generate_batch([p])[0], concurrency)
+        batched_s, batched_tokens = run(chatbot, scheduler.generate, concurrency)
+        baseline_tps = baseline_tokens / baseline_s
+        batched_tps = batched_tokens / batched_s
+        print(f"{concurrency:>11} | {baseline_tps:>17.1f} | {batched_tps:>15.1f} | {batched_tps / baseline_tps:>6.2f}x")
+
+    scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    main()
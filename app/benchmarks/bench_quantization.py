@@ -0,0 +1,79 @@
+"""Tokens/sec and resident memory for each MODEL_QUANTIZATION mode on CPU.
+
+Each mode is measured in a fresh subprocess so RSS is not polluted by other modes. The
+first run of a quantized mode also pays for quantizing and caching the artifact. Without
+torch._weight_int8pack_mm, weight-only-int8 dequantizes its weights on every forward and is
+reported as memory-only: it is expected to decode slower than float32.
+Run from the `app/` directory (the model must already be at MODEL_SAVE_PATH):
+
+    python -m benchmarks.bench_quantization
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import torch
+
+from config import settings
+from utils.model_loader import load_causal_lm
+from utils.quantization import QUANTIZATION_MODES, int8_matmul_available
+
+PROMPT = "Pergunta do Usuário:\nExplique o que é um sistema de gestão de propriedades hoteleiras.\n\nResposta Assistente:"
+NEW_TOKENS = 64
+RUNS = 3
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def measure(mode: str) -> dict:
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(settings.MODEL_SAVE_PATH)
+    load_start = time.perf_counter()
+    model = load_causal_lm(settings.MODEL_SAVE_PATH, "cpu", torch.float32, quantization=mode)
+    load_s = time.perf_counter() - load_start
+
+    inputs = tokenizer(PROMPT, return_tensors="pt")
+    generated, elapsed = 0, 0.0
+    with torch.no_grad():
+        model.generate(**inputs, max_new_tokens=4, do_sample=False)  # warm-up
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            outputs = model.generate(**inputs, max_new_tokens=NEW_TOKENS, min_new_tokens=NEW_TOKENS, do_sample=False,
+                                     pad_token_id=tokenizer.eos_token_id)
+            elapsed += time.perf_counter() - start
+            generated += outputs.shape[1] - inputs["input_ids"].shape[1]
+
+    return {"mode": mode, "load_s": load_s, "tokens_per_s": generated / elapsed, "rss_mb": _rss_mb()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=QUANTIZATION_MODES)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode)))
+        return
+
+    print(f"{'mode':>17} | {'load s':>7} | {'tokens/s':>8} | {'RSS MB':>8} | note")
+    for mode in QUANTIZATION_MODES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_quantization", "--mode", mode],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        note = "memory only (int8 weights dequantized per forward)" if mode == "weight-only-int8" and not int8_matmul_available() else ""
+        print(f"{mode:>17} | {result['load_s']:>7.1f} | {result['tokens_per_s']:>8.2f} | {result['rss_mb']:>8.0f} | {note}")
+
+
+if __name__ == "__main__":
+    main()
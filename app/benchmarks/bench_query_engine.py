@@ -0,0 +1,63 @@
+"""Per-query overhead of building the LlamaIndex query pipeline on every call vs the query engine
+QueryEngine builds once per index, plus QueryEngine.retrieve, which also skips synthesis.
+
+Uses a synthetic in-memory index with MockEmbedding and MockLLM so only the pipeline cost
+is measured, not the embedding model. Run from the `app/` directory:
+
+    python -m benchmarks.bench_query_engine [--docs N] [--queries N]
+"""
+import argparse
+import statistics
+import time
+
+from llama_index.core import Document, Settings, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+
+from models.query_engine_model import QueryEngine
+
+TOP_K = 2
+
+
+def per_query_us(query, queries: int) -> float:
+    samples = []
+    for i in range(queries):
+        start = time.perf_counter()
+        query(f"Como configurar a tarifa do hotel {i}?")
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    Settings.embed_model = MockEmbedding(embed_dim=384)
+    Settings.llm = MockLLM()
+    index = VectorStoreIndex.from_documents([
+        Document(text=f"Documento {i}: procedimento operacional do PMS número {i}.", metadata={"file_path": f"doc_{i}.md"})
+        for i in range(args.docs)
+    ])
+
+    def rebuild_per_query(question: str):
+        # What QueryEngine did before: a fresh retriever and synthesizer per call, then synthesis
+        return index.as_query_engine(llm=None, similarity_top_k=TOP_K).query(question).source_nodes
+
+    query_engine = QueryEngine(index, similarity_top_k=TOP_K)
+
+    per_query_us(rebuild_per_query, 5)  # warm-up
+    per_query = per_query_us(rebuild_per_query, args.queries)
+    built_once = per_query_us(lambda question: query_engine._query_engine.query(question).source_nodes, args.queries)
+    retrieve_only = per_query_us(query_engine.retrieve, args.queries)
+    print(f"{'pipeline':>24} | {'median us/query':>15}")
+    print(f"{'built per query + synth':>24} | {per_query:>15.0f}")
+    print(f"{'built once + synth':>24} | {built_once:>15.0f}")
+    print(f"{'QueryEngine.retrieve':>24} | {retrieve_only:>15.0f}")
+    print(f"\nBuilding once saved {per_query - built_once:.0f} us per query ({per_query / built_once:.2f}x); "
+          f"skipping synthesis saved another {built_once - retrieve_only:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
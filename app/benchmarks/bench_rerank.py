@@ -0,0 +1,83 @@
+"""Net latency of cross-encoder re-ranking: retrieve more, re-rank, prompt with fewer chunks.
+
+Compares plain retrieval of `--baseline-k` chunks against retrieving `--candidates` and keeping
+the best `--top-k` after re-ranking. Re-ranking adds CPU time to retrieval but shrinks the prompt,
+which cuts prefill. Timings come from each request's RequestTimings. Run from the `app/`
+directory (vector store and model must already be set up):
+
+    python -m benchmarks.bench_rerank [--baseline-k 5] [--candidates 10] [--top-k 2]
+"""
+import argparse
+import statistics
+
+import torch
+
+from config import settings
+from models.chatbot_model import ChatBot
+from models.generation_control import GenerationControl
+from models.query_engine_model import QueryEngine
+from services.reranker import CachedCrossEncoderRerank
+from services.vector_service import build_or_load_vector_store
+
+QUESTIONS = [
+    "Como gerar um código promocional?",
+    "Qual tabela guarda os códigos promocionais?",
+    "Como configurar as tarifas de um hotel no PMS?",
+    "O que fazer quando a API de reservas retorna erro 500?",
+    "Como cancelar uma reserva no CRS?",
+    "Onde ficam as imagens dos hotéis?",
+]
+STAGES = ("retrieval_ms", "tokenization_ms", "prefill_ms", "decode_ms", "total_ms")
+
+
+def run(chatbot: ChatBot, label: str) -> dict:
+    rows = []
+    for question in QUESTIONS:
+        control = GenerationControl()
+        chatbot.ask(question, control=control)
+        rows.append(control.timings.as_dict())
+    summary = {stage: statistics.mean(row.get(stage, 0.0) for row in rows) for stage in STAGES}
+    summary["prompt_tokens"] = statistics.mean(row["prompt_tokens"] for row in rows)
+    print(f"{label:>24} | " + " | ".join(f"{summary[key]:>9.0f}" for key in ("prompt_tokens",) + STAGES))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline-k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=settings.RERANK_CANDIDATES)
+    parser.add_argument("--top-k", type=int, default=settings.SIMILARITY_TOP_K)
+    args = parser.parse_args()
+
+    vector_index = build_or_load_vector_store(settings.MARKDOWN_DOCS_PATH, settings.VECTOR_STORE_PATH, settings.EMBEDDING_MODEL_NAME)
+    chatbot = ChatBot(
+        query_engine=QueryEngine(vector_index, similarity_top_k=args.baseline_k),
+        model_path=settings.MODEL_SAVE_PATH,
+        tokenizer_path=settings.MODEL_SAVE_PATH,
+        device=settings.DEVICE,
+        model_torch_dtype=torch.float32 if settings.MODEL_TORCH_DTYPE == "torch.float32" else torch.float16,
+        max_new_tokens=settings.MAX_NEW_TOKENS,
+        temperature=settings.TEMPERATURE,
+    )
+    reranked_engine = QueryEngine(
+        vector_index,
+        similarity_top_k=args.top_k,
+        reranker=CachedCrossEncoderRerank(settings.RERANK_MODEL_NAME, top_n=args.top_k),
+        rerank_candidates=args.candidates,
+    )
+
+    print(f"{'mean per question':>24} | " + " | ".join(f"{key:>9}" for key in ("prompt_tok",) + tuple(s[:-3] for s in STAGES)))
+    run(chatbot, "warm-up")
+    baseline = run(chatbot, f"top-{args.baseline_k}")
+    chatbot.query_engine = reranked_engine
+    reranked = run(chatbot, f"top-{args.candidates} -> rerank {args.top_k}")
+    cached = run(chatbot, "  same, scores cached")
+
+    for label, result in (("re-ranked", reranked), ("re-ranked, cached", cached)):
+        print(f"\n{label}: retrieval {result['retrieval_ms'] - baseline['retrieval_ms']:+.0f} ms, "
+              f"prefill {result['prefill_ms'] - baseline['prefill_ms']:+.0f} ms, "
+              f"total {result['total_ms'] - baseline['total_ms']:+.0f} ms per question")
+
+
+if __name__ == "__main__":
+    main()
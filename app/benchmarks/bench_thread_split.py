@@ -0,0 +1,102 @@
+"""Finds the best INFERENCE_WORKERS x INFERENCE_INTRA_OP_THREADS split for this machine.
+
+Every split of the available cores is measured in a fresh subprocess (the inter-op pool
+can only be sized once per process) by pushing concurrent single-prompt generations through
+ChatBot.generate, the path /ask and /sql take: the GenerationScheduler (GENERATION_MAX_BATCH_SIZE,
+GENERATION_BATCH_WAIT_MS) running its batches on an InferenceExecutor, called from a pool of
+request threads. Run from the `app/` directory:
+
+    python -m benchmarks.bench_thread_split [--cores N] [--requests N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import torch
+
+from config import settings
+from models.chatbot_model import ChatBot, CHAT_INSTRUCTIONS
+from models.generation_control import GenerationControl
+from services.inference_executor import InferenceExecutor
+
+CONTEXT = ["O PMS é o sistema de gestão de propriedades usado pelos hotéis."]
+QUESTION = "O que é o PMS? (#{i})"
+
+
+def measure(workers: int, intra_op_threads: int, requests: int) -> dict:
+    torch_dtype = torch.float32 if settings.MODEL_TORCH_DTYPE == "torch.float32" else torch.float16
+    executor = InferenceExecutor(workers=workers, intra_op_threads=intra_op_threads, inter_op_threads=1)
+    chatbot = ChatBot(
+        query_engine=None,
+        model_path=settings.MODEL_SAVE_PATH,
+        tokenizer_path=settings.MODEL_SAVE_PATH,
+        device=settings.DEVICE,
+        model_torch_dtype=torch_dtype,
+        max_new_tokens=settings.MAX_NEW_TOKENS,
+        temperature=settings.TEMPERATURE,
+        max_batch_size=settings.GENERATION_MAX_BATCH_SIZE,
+        batch_wait_ms=settings.GENERATION_BATCH_WAIT_MS,
+        inference_executor=executor,
+    )
+
+    async def one(i: int) -> float:
+        start = time.perf_counter()
+        # The default loop executor stands in for Starlette's request threadpool
+        await asyncio.get_running_loop().run_in_executor(
+            None, chatbot.generate, (CHAT_INSTRUCTIONS, QUESTION.format(i=i), CONTEXT), GenerationControl()
+        )
+        return time.perf_counter() - start
+
+    async def run_all() -> list:
+        return await asyncio.gather(*(one(i) for i in range(requests)))
+
+    start = time.perf_counter()
+    latencies = asyncio.run(run_all())
+    elapsed = time.perf_counter() - start
+    executor.shutdown()
+    return {
+        "workers": workers,
+        "intra_op_threads": intra_op_threads,
+        "requests_per_s": requests / elapsed,
+        "p50_s": statistics.median(latencies),
+        "p95_s": sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cores", type=int, default=os.cpu_count())
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--intra-op-threads", type=int)
+    args = parser.parse_args()
+
+    if args.workers:
+        print(json.dumps(measure(args.workers, args.intra_op_threads, args.requests)))
+        return
+
+    splits = [(workers, args.cores // workers) for workers in range(1, args.cores + 1) if args.cores % workers == 0]
+    results = []
+    print(f"{'workers':>7} | {'threads':>7} | {'req/s':>6} | {'p50 s':>6} | {'p95 s':>6}")
+    for workers, threads in splits:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_thread_split", "--workers", str(workers),
+             "--intra-op-threads", str(threads), "--requests", str(args.requests)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{workers:>7} | {threads:>7} | {result['requests_per_s']:>6.2f} | {result['p50_s']:>6.2f} | {result['p95_s']:>6.2f}")
+
+    best = max(results, key=lambda result: result["requests_per_s"])
+    print(f"\nBest split for {args.cores} cores: INFERENCE_WORKERS={best['workers']} "
+          f"INFERENCE_INTRA_OP_THREADS={best['intra_op_threads']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Startup load time and per-query CPU of the LlamaIndex JSON store vs the memory-mapped store.
+
+Load time is measured in fresh subprocesses so the JSON parse is not served from a warm
+Python heap; the page cache is warm for both. Per-query cost is CPU time of the vector search
+alone, with random query vectors. Run from the `app/` directory (the vector store must exist):
+
+    python -m benchmarks.bench_vector_store [--queries N] [--dtype float32|float16]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from llama_index.core import Settings, StorageContext, load_index_from_storage
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.vector_stores import VectorStoreQuery
+
+from config import settings
+from services.mmap_vector_store import MMAP_DIR_NAME, MmapVectorStore, build_or_load_mmap_vector_store
+
+
+def load_json_index():
+    Settings.llm = None
+    Settings.embed_model = MockEmbedding(embed_dim=1)
+    return load_index_from_storage(StorageContext.from_defaults(persist_dir=settings.VECTOR_STORE_PATH))
+
+
+def timed_load(kind: str) -> float:
+    start = time.perf_counter()
+    if kind == "json":
+        load_json_index()
+    else:
+        MmapVectorStore(os.path.join(settings.VECTOR_STORE_PATH, MMAP_DIR_NAME))
+    return (time.perf_counter() - start) * 1000
+
+
+def cpu_us_per_query(search, queries: np.ndarray) -> float:
+    start = time.process_time()
+    for query in queries:
+        search(query)
+    return (time.process_time() - start) * 1e6 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dtype", default="float32")
+    parser.add_argument("--load", choices=["json", "mmap"])
+    args = parser.parse_args()
+
+    if args.load:
+        print(json.dumps({"load_ms": timed_load(args.load)}))
+        return
+
+    vector_index = load_json_index()
+    store = build_or_load_mmap_vector_store(vector_index, settings.VECTOR_STORE_PATH, dtype=args.dtype)
+
+    load_ms = {}
+    for kind in ("json", "mmap"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_vector_store", "--load", kind],
+            check=True, capture_output=True, text=True
+        ).stdout
+        load_ms[kind] = json.loads(output.strip().splitlines()[-1])["load_ms"]
+
+    top_k = settings.SIMILARITY_TOP_K
+    queries = np.random.default_rng(0).normal(size=(args.queries, store.embeddings.shape[1])).astype(np.float32)
+    json_search = lambda query: vector_index.vector_store.query(
+        VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k)
+    )
+    mmap_search = lambda query: [store.node(position) for position, _ in store.search(query, top_k)]
+    json_cpu = cpu_us_per_query(json_search, queries)
+    mmap_cpu = cpu_us_per_query(mmap_search, queries)
+
+    print(f"{len(store)} nodes, top_k={top_k}, mmap dtype {store.embeddings.dtype}")
+    print(f"{'store':>6} | {'load ms':>9} | {'CPU us/query':>12}")
+    print(f"{'json':>6} | {load_ms['json']:>9.1f} | {json_cpu:>12.0f}")
+    print(f"{'mmap':>6} | {load_ms['mmap']:>9.1f} | {mmap_cpu:>12.0f}")
+    print(f"\nLoad {load_ms['json'] / load_ms['mmap']:.0f}x faster, query CPU {json_cpu / mmap_cpu:.1f}x lower")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 import os
+from typing import Optional
 
 load_dotenv()
 
@@ -23,11 +24,93 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL_NAME: str = os.getenv("EMBEDDING_MODEL_NAME")
     DEVICE: str = os.getenv("DEVICE")
     MODEL_TORCH_DTYPE: str = os.getenv("MODEL_TORCH_DTYPE")
+    MODEL_BACKEND: str = os.getenv("MODEL_BACKEND", "transformers")  # transformers | onnxruntime (CPU only)
+    MODEL_QUANTIZATION: str = os.getenv("MODEL_QUANTIZATION", "none")  # none | dynamic-int8 | weight-only-int8 (CPU only)
+
+    # Memory-mapped safetensors weights, shared through the page cache by every process (CPU only)
+    MODEL_MMAP_WEIGHTS: bool = os.getenv("MODEL_MMAP_WEIGHTS", False)
+    # Model worker processes for generation (0 = generate in the API process); implies MODEL_MMAP_WEIGHTS
+    MODEL_WORKER_PROCESSES: int = os.getenv("MODEL_WORKER_PROCESSES", 0)
+    MODEL_WORKER_THREADS: int = os.getenv("MODEL_WORKER_THREADS", 0)  # 0 = cpu_count // MODEL_WORKER_PROCESSES
+
+    # Assisted (speculative) decoding with a smaller draft model sharing the LLM tokenizer
+    SPECULATIVE_DECODING_ENABLED: bool = os.getenv("SPECULATIVE_DECODING_ENABLED", False)
+    DRAFT_MODEL_NAME: Optional[str] = os.getenv("DRAFT_MODEL_NAME")
+    DRAFT_MODEL_SAVE_PATH: Optional[str] = os.getenv("DRAFT_MODEL_SAVE_PATH")
 
     # Generation Parameters
     MAX_NEW_TOKENS: int = os.getenv("MAX_NEW_TOKENS")
     TEMPERATURE: float = os.getenv("TEMPERATURE")
-    SIMILARITY_TOP_K: int = os.getenv("SIMILARITY_TOP_K")
+    SIMILARITY_TOP_K: int = os.getenv("SIMILARITY_TOP_K", 2)
+
+    # Vector search backend: none (exact, LlamaIndex JSON store) | mmap (exact, memory-mapped .npy matrix)
+    # | hnsw | ivf (approximate, needs faiss-cpu)
+    VECTOR_INDEX_BACKEND: str = os.getenv("VECTOR_INDEX_BACKEND", "none")
+    MMAP_VECTOR_DTYPE: str = os.getenv("MMAP_VECTOR_DTYPE", "float32")  # float32 | float16 (half the size, slower scoring)
+    ANN_HNSW_M: int = os.getenv("ANN_HNSW_M", 32)
+    ANN_HNSW_EF_CONSTRUCTION: int = os.getenv("ANN_HNSW_EF_CONSTRUCTION", 200)
+    ANN_HNSW_EF_SEARCH: int = os.getenv("ANN_HNSW_EF_SEARCH", 64)  # higher = better recall, slower
+    ANN_IVF_NLIST: int = os.getenv("ANN_IVF_NLIST", 0)  # 0 = 4 * sqrt(number of nodes)
+    ANN_IVF_NPROBE: int = os.getenv("ANN_IVF_NPROBE", 16)  # higher = better recall, slower
+
+    # One index shard per space (VECTOR_STORE_PATH/spaces/<space>), loaded on first use and searched concurrently;
+    # lets requests filter by space. Replaces VECTOR_INDEX_BACKEND and hybrid retrieval when enabled
+    SPACE_SHARDS_ENABLED: bool = os.getenv("SPACE_SHARDS_ENABLED", False)
+    SPACE_SHARD_WORKERS: int = os.getenv("SPACE_SHARD_WORKERS", 0)  # 0 = one thread per shard
+
+    # Hybrid retrieval: BM25 (persisted in VECTOR_STORE_PATH/bm25) fused with vector search by reciprocal rank fusion
+    HYBRID_RETRIEVAL_ENABLED: bool = os.getenv("HYBRID_RETRIEVAL_ENABLED", False)
+    HYBRID_CANDIDATE_K: int = os.getenv("HYBRID_CANDIDATE_K", 20)  # candidates taken from each ranking before fusion
+    HYBRID_RRF_K: int = os.getenv("HYBRID_RRF_K", 60)
+
+    # Cross-encoder re-ranking on CPU: RERANK_CANDIDATES nodes are retrieved and the best SIMILARITY_TOP_K kept
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", False)
+    RERANK_MODEL_NAME: str = os.getenv("RERANK_MODEL_NAME", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    RERANK_CANDIDATES: int = os.getenv("RERANK_CANDIDATES", 10)
+    RERANK_CACHE_MAX_ENTRIES: int = os.getenv("RERANK_CACHE_MAX_ENTRIES", 8192)
+
+    # Near-duplicate chunks (SimHash signatures within NEAR_DUPLICATE_MAX_DISTANCE of 64 bits) are dropped from the
+    # context; the freed slots are backfilled from NEAR_DUPLICATE_CANDIDATES retrieved nodes (or RERANK_CANDIDATES)
+    NEAR_DUPLICATE_DEDUP_ENABLED: bool = os.getenv("NEAR_DUPLICATE_DEDUP_ENABLED", False)
+    NEAR_DUPLICATE_MAX_DISTANCE: int = os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", 3)
+    NEAR_DUPLICATE_CANDIDATES: int = os.getenv("NEAR_DUPLICATE_CANDIDATES", 6)
+
+    # Generation Scheduler (GENERATION_MAX_BATCH_SIZE=1 disables batching)
+    GENERATION_MAX_BATCH_SIZE: int = os.getenv("GENERATION_MAX_BATCH_SIZE", 8)
+    GENERATION_BATCH_WAIT_MS: float = os.getenv("GENERATION_BATCH_WAIT_MS", 10)
+    PREFIX_CACHE_ENABLED: bool = os.getenv("PREFIX_CACHE_ENABLED", True)
+
+    # Wall-clock generation budget per request in seconds (0 = no limit); requests may override it
+    ASK_MAX_TIME_SECONDS: float = os.getenv("ASK_MAX_TIME_SECONDS", 30)
+    SQL_MAX_TIME_SECONDS: float = os.getenv("SQL_MAX_TIME_SECONDS", 60)
+
+    # /ask/batch: questions generated together per batch, and the most questions accepted per call
+    ASK_BATCH_SIZE: int = os.getenv("ASK_BATCH_SIZE", 8)
+    ASK_BATCH_MAX_QUESTIONS: int = os.getenv("ASK_BATCH_MAX_QUESTIONS", 5000)
+
+    # Inference Executor (0 threads = cpu_count // INFERENCE_WORKERS / PyTorch default)
+    INFERENCE_WORKERS: int = os.getenv("INFERENCE_WORKERS", 8)
+    INFERENCE_INTRA_OP_THREADS: int = os.getenv("INFERENCE_INTRA_OP_THREADS", 0)
+    INFERENCE_INTER_OP_THREADS: int = os.getenv("INFERENCE_INTER_OP_THREADS", 0)
+
+    # LRU cache of question embeddings (repeated questions skip the embedding model)
+    QUERY_EMBEDDING_CACHE_ENABLED: bool = os.getenv("QUERY_EMBEDDING_CACHE_ENABLED", True)
+    QUERY_EMBEDDING_CACHE_MAX_ENTRIES: int = os.getenv("QUERY_EMBEDDING_CACHE_MAX_ENTRIES", 2048)
+    # Micro-batching of question embeddings across concurrent requests (1 disables)
+    QUERY_EMBEDDING_BATCH_SIZE: int = os.getenv("QUERY_EMBEDDING_BATCH_SIZE", 32)
+    QUERY_EMBEDDING_BATCH_WAIT_MS: float = os.getenv("QUERY_EMBEDDING_BATCH_WAIT_MS", 5)
+
+    # Semantic Answer Cache
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", True)
+    SEMANTIC_CACHE_THRESHOLD: float = os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95)
+    SEMANTIC_CACHE_MAX_ENTRIES: int = os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 1024)
+    SEMANTIC_CACHE_TTL_SECONDS: float = os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 3600)
+
+    # Exact-match Response Cache (RESPONSE_CACHE_SQLITE_PATH enables the shared on-disk tier)
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", True)
+    RESPONSE_CACHE_MAX_ENTRIES: int = os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 4096)
+    RESPONSE_CACHE_TTL_SECONDS: float = os.getenv("RESPONSE_CACHE_TTL_SECONDS", 86400)
+    RESPONSE_CACHE_SQLITE_PATH: Optional[str] = os.getenv("RESPONSE_CACHE_SQLITE_PATH")
 
     # API Configuration
     API_TITLE: str = os.getenv("API_TITLE")
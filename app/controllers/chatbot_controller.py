@@ -1,22 +1,181 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from views.schemas import Question
-from models.chatbot_model import ChatBot
-from utils.dependencies import get_chatbot
-import re
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Request
 from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from views.schemas import BatchQuestion, Question
+from models.chatbot_model import ChatBot
+from models.generation_control import GenerationControl, resolve_max_time
+from services.response_cache import ResponseCache
+from utils.dependencies import get_chatbot, get_response_cache
+from utils.disconnect import cancel_on_disconnect
+from utils.request_log import log_request
+from utils.spaces import validate_spaces
+from config import settings
+from llama_index.core import Settings as LlamaIndexSettings
+from services.query_embedding_cache import CachedQueryEmbedding
+from services.query_embedding_batcher import MicroBatchedQueryEmbedding
+from services.space_shards import ShardedRetriever
+import json
+import time
+from typing import Iterator, List, Optional
 
 router = APIRouter()
 
 @router.post("/ask")
-async def ask_question(question_data: Question, chatbot: ChatBot = Depends(get_chatbot)):
+async def ask_question(question_data: Question,
+                       request: Request,
+                       chatbot: ChatBot = Depends(get_chatbot),
+                       response_cache: Optional[ResponseCache] = Depends(get_response_cache)):
+    validate_spaces(chatbot.query_engine, question_data.spaces)
     try:
-        answer = await run_in_threadpool(chatbot.ask, question_data.question)
-        clean_answer = re.sub(r'file_path:.*', '', answer, flags=re.DOTALL)
-        return {"answer": clean_answer.strip()}
+        control = GenerationControl(resolve_max_time(question_data.max_time, settings.ASK_MAX_TIME_SECONDS))
+        cache_key = None
+        if response_cache is not None:
+            cache_key = ResponseCache.make_key(
+                "ask", question_data.question.casefold(), chatbot.model_id, chatbot.query_engine.index_version,
+                sorted(question_data.spaces or [])
+            )
+            cached_response = response_cache.get(cache_key)
+            if cached_response is not None:
+                timings = control.timings.as_dict()
+                log_request("ask", timings, response_cache_hit=True)
+                return {**cached_response, "timings": timings}
+
+        answer = await cancel_on_disconnect(
+            request, control, run_in_threadpool(chatbot.ask, question_data.question, control=control, spaces=question_data.spaces)
+        )
+        response = {"answer": answer.strip(), "truncated": control.truncated}
+        if cache_key is not None and not control.stopped_early:
+            response_cache.set(cache_key, response)
+        timings = control.timings.as_dict()
+        log_request("ask", timings, truncated=control.truncated, cancelled=control.cancelled)
+        return {**response, "timings": timings}
     except Exception as e:
         print(f"Error during ask_question: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
-@router.get("/ping") 
+
+def _sse_event(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_answer(chatbot: ChatBot, question: str, control: GenerationControl,
+                   spaces: Optional[List[str]] = None) -> Iterator[str]:
+    start = time.perf_counter()
+    first_token_at = None
+    started_answer = False
+    try:
+        for text in chatbot.ask_stream(question, control=control, spaces=spaces):
+            if not started_answer:
+                text = text.lstrip()
+                started_answer = bool(text)
+            if text:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                yield _sse_event({"token": text})
+    except Exception as e:
+        print(f"Error during ask_question_stream: {e}")
+        yield _sse_event({"detail": f"An error occurred: {str(e)}"}, event="error")
+        return
+
+    total_ms = (time.perf_counter() - start) * 1000
+    ttft_ms = (first_token_at - start) * 1000 if first_token_at is not None else None
+    timings = control.timings.as_dict()
+    log_request("ask/stream", timings, ttft_ms=ttft_ms, truncated=control.truncated)
+    print(f"ask_question_stream finished. ttft_ms={ttft_ms}, total_ms={total_ms:.1f}, truncated={control.truncated}")
+    yield _sse_event({"ttft_ms": ttft_ms, "total_ms": total_ms, "truncated": control.truncated, "timings": timings}, event="done")
+
+
+@router.post("/ask/stream")
+async def ask_question_stream(question_data: Question, chatbot: ChatBot = Depends(get_chatbot)):
+    validate_spaces(chatbot.query_engine, question_data.spaces)
+    return StreamingResponse(
+        _stream_answer(
+            chatbot, question_data.question,
+            GenerationControl(resolve_max_time(question_data.max_time, settings.ASK_MAX_TIME_SECONDS)),
+            question_data.spaces
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _stream_batch(chatbot: ChatBot, batch: BatchQuestion, response_cache: Optional[ResponseCache]) -> Iterator[str]:
+    """One NDJSON line per question, in completion order; `index` is the question's position in the request."""
+    max_time = resolve_max_time(batch.max_time, settings.ASK_MAX_TIME_SECONDS)
+    cache_keys, pending = {}, []
+    for index, question in enumerate(batch.questions):
+        if response_cache is not None:
+            cache_keys[index] = ResponseCache.make_key(
+                "ask", question.casefold(), chatbot.model_id, chatbot.query_engine.index_version, sorted(batch.spaces or [])
+            )
+            cached_response = response_cache.get(cache_keys[index])
+            if cached_response is not None:
+                yield json.dumps({"index": index, **cached_response}, ensure_ascii=False) + "\n"
+                continue
+        pending.append(index)
+    if not pending:
+        return
+
+    try:
+        for position, answer, control in chatbot.ask_batch(
+            [batch.questions[index] for index in pending], max_time=max_time, spaces=batch.spaces,
+            batch_size=settings.ASK_BATCH_SIZE
+        ):
+            index = pending[position]
+            response = {"answer": answer.strip(), "truncated": control.truncated}
+            if index in cache_keys and not control.stopped_early:
+                response_cache.set(cache_keys[index], response)
+            timings = control.timings.as_dict()
+            log_request("ask/batch", timings, index=index, truncated=control.truncated)
+            yield json.dumps({"index": index, **response, "timings": timings}, ensure_ascii=False) + "\n"
+    except Exception as e:
+        print(f"Error during ask_question_batch: {e}")
+        yield json.dumps({"error": f"An error occurred: {str(e)}"}, ensure_ascii=False) + "\n"
+
+
+@router.post("/ask/batch")
+async def ask_question_batch(batch: BatchQuestion,
+                             chatbot: ChatBot = Depends(get_chatbot),
+                             response_cache: Optional[ResponseCache] = Depends(get_response_cache)):
+    if len(batch.questions) > settings.ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.ASK_BATCH_MAX_QUESTIONS} questions per batch.")
+    validate_spaces(chatbot.query_engine, batch.spaces)
+    return StreamingResponse(
+        _stream_batch(chatbot, batch, response_cache),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/cache/stats")
+async def cache_stats(chatbot: ChatBot = Depends(get_chatbot),
+                      response_cache: Optional[ResponseCache] = Depends(get_response_cache)):
+    embed_model = LlamaIndexSettings.embed_model
+    query_embedding_cache = embed_model if isinstance(embed_model, CachedQueryEmbedding) else None
+    query_embedding_batcher = query_embedding_cache.wrapped if query_embedding_cache else embed_model
+    return {
+        "semantic_cache": chatbot.semantic_cache.stats() if chatbot.semantic_cache else None,
+        "response_cache": response_cache.stats() if response_cache else None,
+        "query_embedding_cache": query_embedding_cache.stats() if query_embedding_cache else None,
+        "rerank": chatbot.query_engine.reranker.stats() if chatbot.query_engine.reranker else None,
+        "query_embedding_batcher": (
+            query_embedding_batcher.stats() if isinstance(query_embedding_batcher, MicroBatchedQueryEmbedding) else None
+        ),
+    }
+
+@router.get("/generation/stats")
+async def generation_stats(chatbot: ChatBot = Depends(get_chatbot)):
+    scheduler = chatbot.scheduler
+    return {
+        "scheduler": {"batches_run": scheduler.batches_run, "prompts_served": scheduler.prompts_served} if scheduler else None,
+        "speculative_decoding": chatbot.assisted_metrics.stats() if chatbot.assisted_metrics else None,
+        "early_stopping": chatbot.generation_stats(),
+    }
+
+@router.get("/spaces")
+async def list_spaces(chatbot: ChatBot = Depends(get_chatbot)):
+    retriever = chatbot.query_engine.retriever
+    return retriever.stats() | {"spaces": list(retriever.shards)} if isinstance(retriever, ShardedRetriever) else {"spaces": None}
+
+@router.get("/ping")
 async def ping_router():
     return {"message": "Chatbot controller is active."}
\ No newline at end of file
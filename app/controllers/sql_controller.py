@@ -1,27 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from typing import Any, List, Optional
 from models.sql_processor_model import SQLProcessor
+from models.generation_control import GenerationControl, resolve_max_time
+from services.response_cache import ResponseCache
 from views.schemas import (
     SQLGenerateRequest, SQLGenerateResponse,
     SQLAlterRequest, SQLAlterResponse,
     SQLValidateRequest, SQLValidateResponse
 )
-from utils.dependencies import get_sql_processor
+from utils.dependencies import get_sql_processor, get_response_cache
+from utils.disconnect import cancel_on_disconnect
+from utils.request_log import log_request
+from utils.spaces import validate_spaces
+from config import settings
 
 router = APIRouter(prefix="/sql", tags=["SQL"])
 
+def _cache_key(response_cache: Optional[ResponseCache], sql_processor: SQLProcessor, endpoint: str, *parts: Any) -> Optional[str]:
+    if response_cache is None or sql_processor.llm_client is None:
+        return None
+    chatbot = sql_processor.llm_client.chatbot
+    return ResponseCache.make_key(
+        endpoint, *parts, chatbot.model_id, chatbot.query_engine.index_version, sql_processor.schema_version
+    )
+
+def _validate_spaces(sql_processor: SQLProcessor, spaces: Optional[List[str]]):
+    if sql_processor.llm_client is not None:
+        validate_spaces(sql_processor.llm_client.chatbot.query_engine, spaces)
+
 @router.post("/generate", response_model=SQLGenerateResponse)
-async def generate_sql(request: SQLGenerateRequest, sql_processor: SQLProcessor = Depends(get_sql_processor)):
+async def generate_sql(request: SQLGenerateRequest,
+                       http_request: Request,
+                       sql_processor: SQLProcessor = Depends(get_sql_processor),
+                       response_cache: Optional[ResponseCache] = Depends(get_response_cache)):
+    _validate_spaces(sql_processor, request.spaces)
     try:
-        response = await sql_processor.generate_sql(request)
+        control = GenerationControl(resolve_max_time(request.max_time, settings.SQL_MAX_TIME_SECONDS))
+        cache_key = _cache_key(
+            response_cache, sql_processor, "sql_generate",
+            request.prompt, request.dialect, request.perform_semantic_validation, sorted(request.spaces or [])
+        )
+        if cache_key is not None:
+            cached_response = response_cache.get(cache_key)
+            if cached_response is not None:
+                timings = control.timings.as_dict()
+                log_request("sql/generate", timings, response_cache_hit=True)
+                return {**cached_response, "timings": timings}
+
+        response = await cancel_on_disconnect(http_request, control, sql_processor.generate_sql(request, control=control))
+        if cache_key is not None and response.generated_sql and not control.stopped_early:
+            response_cache.set(cache_key, jsonable_encoder(response, exclude={"timings"}))
+        response.timings = control.timings.as_dict()
+        log_request("sql/generate", response.timings, success=response.success,
+                    truncated=control.truncated, cancelled=control.cancelled)
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar SQL: {str(e)}")
 
 @router.post("/alter", response_model=SQLAlterResponse)
-async def alter_sql(request: SQLAlterRequest, sql_processor: SQLProcessor = Depends(get_sql_processor)):
+async def alter_sql(request: SQLAlterRequest,
+                    http_request: Request,
+                    sql_processor: SQLProcessor = Depends(get_sql_processor),
+                    response_cache: Optional[ResponseCache] = Depends(get_response_cache)):
+    _validate_spaces(sql_processor, request.spaces)
     try:
-        response = await sql_processor.alter_sql(request)
+        control = GenerationControl(resolve_max_time(request.max_time, settings.SQL_MAX_TIME_SECONDS))
+        cache_key = _cache_key(
+            response_cache, sql_processor, "sql_alter",
+            request.original_sql, request.alter_prompt, request.dialect, request.perform_semantic_validation,
+            sorted(request.spaces or [])
+        )
+        if cache_key is not None:
+            cached_response = response_cache.get(cache_key)
+            if cached_response is not None:
+                timings = control.timings.as_dict()
+                log_request("sql/alter", timings, response_cache_hit=True)
+                return {**cached_response, "timings": timings}
+
+        response = await cancel_on_disconnect(http_request, control, sql_processor.alter_sql(request, control=control))
+        if cache_key is not None and response.generated_sql and not control.stopped_early:
+            response_cache.set(cache_key, jsonable_encoder(response, exclude={"timings"}))
+        response.timings = control.timings.as_dict()
+        log_request("sql/alter", response.timings, success=response.success,
+                    truncated=control.truncated, cancelled=control.cancelled)
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao alterar SQL: {str(e)}")
@@ -5,7 +5,10 @@ import torch
 from config import settings
 from services.download_html import download_main
 from services.document_processor import convert_html_to_markdown
-from services.vector_service import build_or_load_vector_store
+from services.vector_service import build_or_load_vector_store, configure_embed_model
+from services.space_shards import build_or_load_space_shards
+from services.mmap_vector_store import mmap_store_is_current
+from services.bm25_index import bm25_index_is_current
 from utils.model_loader import download_model
 from controllers.sql_controller import router as sql_router
 from utils.dependencies import get_chatbot_instance, init_dependencies
@@ -20,18 +23,43 @@ async def startup_event():
     # print(f"Checking for HTML to Markdown conversion...")
     # convert_html_to_markdown(base_html_docs_path=settings.HTML_DOCS_PATH, output_base_path=settings.MARKDOWN_DOCS_PATH)
 
-    print(f"Building/Loading vector store from {settings.MARKDOWN_DOCS_PATH} to {settings.VECTOR_STORE_PATH}...")
-    vector_index = build_or_load_vector_store(
-        docs_base_dir=settings.MARKDOWN_DOCS_PATH,
-        vector_store_persist_dir=settings.VECTOR_STORE_PATH,
-        embedding_model_name=settings.EMBEDDING_MODEL_NAME
+    embedding_settings = dict(
+        query_embedding_cache_size=settings.QUERY_EMBEDDING_CACHE_MAX_ENTRIES if settings.QUERY_EMBEDDING_CACHE_ENABLED else 0,
+        query_embedding_batch_size=settings.QUERY_EMBEDDING_BATCH_SIZE,
+        query_embedding_batch_wait_ms=settings.QUERY_EMBEDDING_BATCH_WAIT_MS
     )
+    vector_index, space_shards = None, None
+    if settings.SPACE_SHARDS_ENABLED:
+        print(f"Registering per-space shards from {settings.MARKDOWN_DOCS_PATH} in {settings.VECTOR_STORE_PATH}...")
+        configure_embed_model(settings.EMBEDDING_MODEL_NAME, **embedding_settings)
+        space_shards = build_or_load_space_shards(settings.MARKDOWN_DOCS_PATH, settings.VECTOR_STORE_PATH)
+    else:
+        print(f"Building/Loading vector store from {settings.MARKDOWN_DOCS_PATH} to {settings.VECTOR_STORE_PATH}...")
+        vector_index = build_or_load_vector_store(
+            docs_base_dir=settings.MARKDOWN_DOCS_PATH,
+            vector_store_persist_dir=settings.VECTOR_STORE_PATH,
+            embedding_model_name=settings.EMBEDDING_MODEL_NAME,
+            **embedding_settings,
+            # The JSON index is only needed to (re)build derived stores or to serve queries itself
+            load_index=not (
+                settings.VECTOR_INDEX_BACKEND == "mmap" and mmap_store_is_current(settings.VECTOR_STORE_PATH, settings.MMAP_VECTOR_DTYPE)
+                and (not settings.HYBRID_RETRIEVAL_ENABLED or bm25_index_is_current(settings.VECTOR_STORE_PATH))
+            ),
+            build_bm25=settings.HYBRID_RETRIEVAL_ENABLED
+        )
 
     print(f"Ensuring LLM model ({settings.LLM_MODEL_NAME}) is available at {settings.MODEL_SAVE_PATH}...")
-    download_model(model_name=settings.LLM_MODEL_NAME, save_path=settings.MODEL_SAVE_PATH)
+    download_model(
+        model_name=settings.LLM_MODEL_NAME,
+        save_path=settings.MODEL_SAVE_PATH,
+        export_onnx=settings.MODEL_BACKEND == "onnxruntime"
+    )
+    if settings.SPECULATIVE_DECODING_ENABLED:
+        print(f"Ensuring draft model ({settings.DRAFT_MODEL_NAME}) is available at {settings.DRAFT_MODEL_SAVE_PATH}...")
+        download_model(model_name=settings.DRAFT_MODEL_NAME, save_path=settings.DRAFT_MODEL_SAVE_PATH)
     
     print("Initializing application dependencies (ChatBot, QueryEngine, SQLProcessor)...")
-    init_dependencies(vector_index=vector_index, app_settings=settings)
+    init_dependencies(vector_index=vector_index, app_settings=settings, space_shards=space_shards)
     print("Application startup complete.")
 
 app = FastAPI(
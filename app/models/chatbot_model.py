@@ -1,56 +1,406 @@
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoTokenizer, TextIteratorStreamer, StoppingCriteriaList
 import torch
 import os
-from models.query_engine_model import QueryEngine
+import time
+from concurrent.futures import Future, as_completed
+from threading import Lock, Thread
+from typing import Iterator, List, Optional, Tuple
+from models.query_engine_model import QueryEngine, RetrievedChunk
+from models.generation_scheduler import GenerationScheduler
+from models.prefix_cache import PrefixCache
+from models.semantic_cache import SemanticCache
+from models.speculative_decoding import AssistedGenerationMetrics
+from models.prompt_builder import PromptBuilder
+from models.generation_control import GenerationControl, GenerationControlCriteria
+from utils.model_loader import load_causal_lm
+
+MAX_PROMPT_TOKENS = 1024
+
+CHAT_INSTRUCTIONS = (
+    "Você é um assistente prestativo. Use o seguinte contexto para responder à pergunta no final. "
+    "Se a resposta não estiver no contexto, diga que você não sabe, não tente inventar uma resposta.\n\n"
+)
+
+# (instructions, question, context chunks in score order)
+PromptParts = Tuple[str, str, List[str]]
 
 class ChatBot:
-    def __init__(self, 
+    def __init__(self,
                  query_engine: QueryEngine,
                  model_path: str,
                  tokenizer_path: str,
                  device: str,
                  model_torch_dtype: torch.dtype,
                  max_new_tokens: int,
-                 temperature: float):
-        
+                 temperature: float,
+                 max_batch_size: int = 1,
+                 batch_wait_ms: float = 10.0,
+                 use_prefix_cache: bool = True,
+                 semantic_cache: Optional[SemanticCache] = None,
+                 quantization: str = "none",
+                 draft_model_path: Optional[str] = None,
+                 mmap_weights: bool = False,
+                 worker_pool=None,
+                 backend: str = "transformers",
+                 inference_executor=None):
+
         print(f"Initializing ChatBot model from: {model_path} on device: {device}")
         self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_path,
-            torch_dtype=model_torch_dtype,
-            device_map=device if device != "cpu" else None,
-        )
-        if device == "cpu" and (not hasattr(self.model, 'hf_device_map') or not self.model.hf_device_map):
-             self.model.to(torch.device("cpu"))
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = load_causal_lm(model_path, device, model_torch_dtype, quantization, mmap_weights, backend)
+        self.backend = backend
+        self.draft_model = None
+        self.assisted_metrics = None
+        if draft_model_path and backend != "transformers":
+            raise ValueError("Assisted generation with a draft model requires MODEL_BACKEND=transformers.")
+        if draft_model_path:
+            # The draft must share the target's tokenizer; it proposes tokens the target verifies in one pass
+            print(f"Loading draft model for assisted generation from: {draft_model_path}")
+            self.draft_model = load_causal_lm(draft_model_path, device, model_torch_dtype, quantization, mmap_weights)
+            self.assisted_metrics = AssistedGenerationMetrics(self.model, self.draft_model)
 
         self.query_engine = query_engine
+        self.model_id = model_path if quantization == "none" else f"{model_path}|{quantization}"
+        if draft_model_path:
+            self.model_id += f"|draft={draft_model_path}"
+        if backend != "transformers":
+            self.model_id += f"|{backend}"
         self.device = device
         self.max_new_tokens = max_new_tokens
         self.temperature = temperature
-        print(f"ChatBot initialized. Tokenizer: {tokenizer_path}, Model: {model_path}, Device: {self.model.device}")
-
-    def ask(self, prompt: str) -> str:
-        context = self.query_engine.query(prompt)
-        final_prompt = (
-            f"Você é um assistente prestativo. Use o seguinte contexto para responder à pergunta no final. "
-            f"Se a resposta não estiver no contexto, diga que você não sabe, não tente inventar uma resposta.\n\n"
-            f"Contexto Fornecido:\n{context}\n\n"
-            f"Pergunta do Usuário:\n{prompt}\n\n"
-            f"Resposta Assistente:"
+        self.semantic_cache = semantic_cache
+        self.cancelled_generations = 0
+        self.truncated_generations = 0
+        self.cancelled_tokens_generated = 0
+        self.cancelled_tokens_saved = 0
+        self.truncated_tokens_generated = 0
+        self.truncated_tokens_saved = 0
+        self._stats_lock = Lock()
+        # When set, non-streaming generations are routed to model worker processes
+        self.worker_pool = worker_pool
+        # When set, every in-process generation (batched, direct or streamed) runs on its threads
+        self.inference_executor = inference_executor
+        # A row whose last token is one of these has finished (EOS, or padding after it)
+        generation_eos = getattr(getattr(self.model, "generation_config", None), "eos_token_id", None)
+        self._finished_token_ids = {
+            token_id for token_id in [self.tokenizer.eos_token_id, self.tokenizer.pad_token_id,
+                                      *(generation_eos if isinstance(generation_eos, list) else [generation_eos])]
+            if token_id is not None
+        }
+        self.prompt_builder = PromptBuilder(self.tokenizer, max_prompt_tokens=MAX_PROMPT_TOKENS)
+        self.prefix_cache = None
+        # Reusing past_key_values needs direct access to the PyTorch model's cache
+        if use_prefix_cache and backend == "transformers":
+            self.prefix_cache = PrefixCache(self.model, self.tokenizer)
+            self.prefix_cache.warm(CHAT_INSTRUCTIONS)
+        self.scheduler = None
+        if max_batch_size > 1:
+            self.scheduler = GenerationScheduler(
+                self.generate_batch, max_batch_size=max_batch_size, max_wait_ms=batch_wait_ms,
+                executor=inference_executor,
+                max_concurrent_batches=inference_executor.workers if inference_executor else 1
+            )
+        print(f"ChatBot initialized. Tokenizer: {tokenizer_path}, Model: {model_path}, Backend: {backend}, Quantization: {quantization}, Device: {self.model.device}")
+
+    def _prompt_parts(self, prompt: str, instructions: Optional[str], extra_context: Optional[List[str]],
+                      spaces: Optional[List[str]] = None, control: Optional[GenerationControl] = None) -> PromptParts:
+        retrieved = self.query_engine.retrieve(prompt, spaces)
+        if control is not None:
+            self._record_dedup(retrieved, control)
+        chunks = [self._format_chunk(chunk) for chunk in retrieved] + (extra_context or [])
+        return (instructions or CHAT_INSTRUCTIONS, prompt, chunks)
+
+    def _record_dedup(self, chunks: List[RetrievedChunk], control: GenerationControl):
+        if self.query_engine.near_duplicate_distance is None:
+            return
+        control.timings.dedup_tokens_saved = sum(
+            len(self.tokenizer(duplicate, add_special_tokens=False)["input_ids"])
+            for chunk in chunks for duplicate in chunk.duplicates
         )
-        
-        inputs = self.tokenizer(final_prompt, return_tensors="pt", truncation=True, max_length=1024).to(self.model.device) # Use model.device
-        
-        self.model.eval()
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=self.max_new_tokens,
-                do_sample=True,
-                temperature=self.temperature,
-                top_p=0.9,
-                pad_token_id=self.tokenizer.eos_token_id
+
+    @staticmethod
+    def _format_chunk(chunk: RetrievedChunk) -> str:
+        # Only the document name is shown, so the model has no metadata lines to echo back
+        if not chunk.source_path:
+            return chunk.text
+        return f"Documento: {os.path.splitext(os.path.basename(chunk.source_path))[0]}\n{chunk.text}"
+
+    def ask(self, prompt: str, instructions: Optional[str] = None, extra_context: Optional[List[str]] = None,
+            control: Optional[GenerationControl] = None, spaces: Optional[List[str]] = None) -> str:
+        control = control or GenerationControl()
+        # Only plain, unscoped chat questions are matched semantically; SQL prompts differ in details
+        # that matter and a space-scoped answer may not hold for other spaces
+        use_semantic_cache = self.semantic_cache is not None and instructions is None and not spaces
+        if use_semantic_cache:
+            with control.timings.measure("semantic_cache"):
+                cached_answer, question_embedding = self.semantic_cache.lookup(prompt, self.query_engine.index_version)
+            if cached_answer is not None:
+                return cached_answer
+
+        with control.timings.measure("retrieval"):
+            prompt_parts = self._prompt_parts(prompt, instructions, extra_context, spaces, control)
+
+        answer = self.generate(prompt_parts, control)
+
+        # A cancelled or truncated answer is partial and must not be served to later questions
+        if use_semantic_cache and not control.stopped_early:
+            self.semantic_cache.store(question_embedding, answer, self.query_engine.index_version)
+        return answer
+
+    def ask_batch(self, questions: List[str], max_time: Optional[float] = None, spaces: Optional[List[str]] = None,
+                  batch_size: int = 8) -> Iterator[Tuple[int, str, GenerationControl]]:
+        """Answers many questions, yielding (index, answer, control) as soon as each answer is ready.
+
+        Questions are embedded and retrieved a window at a time, then generated `batch_size` rows at
+        a time with similar prompt lengths together, so rows pad little. Every group of a window is
+        submitted at once, so the groups use all the inference executor's workers. Each answer's
+        `max_time` budget starts when its generation is scheduled, not when the batch arrives.
+        """
+        workers = self.inference_executor.workers if self.inference_executor else 1
+        window_size = batch_size * max(4, workers)
+        for window_start in range(0, len(questions), window_size):
+            window = list(range(window_start, min(window_start + window_size, len(questions))))
+            start = time.perf_counter()
+            retrieved = dict(zip(window, self.query_engine.retrieve_batch([questions[i] for i in window], spaces)))
+            retrieval_ms = (time.perf_counter() - start) * 1000 / len(window)
+            prompts = {
+                i: (CHAT_INSTRUCTIONS, questions[i], [self._format_chunk(chunk) for chunk in chunks])
+                for i, chunks in retrieved.items()
+            }
+
+            def new_control(i: int) -> GenerationControl:
+                control = GenerationControl(max_time)
+                control.timings.add("retrieval", retrieval_ms)
+                self._record_dedup(retrieved[i], control)
+                return control
+            window.sort(key=lambda i: len(questions[i]) + sum(len(chunk) for chunk in prompts[i][2]))
+
+            if self.worker_pool:
+                # The workers batch for themselves; hand them the whole window at once
+                futures = {}
+                for i in window:
+                    control = new_control(i)
+                    futures[self.worker_pool.generate_async(prompts[i], control)] = (i, control)
+                for future in as_completed(futures):
+                    i, control = futures[future]
+                    answer = future.result()
+                    self._record_worker_stop(control)
+                    yield i, answer, control
+                continue
+
+            def run_group(group: List[int]) -> Tuple[List[int], List[str], List[GenerationControl]]:
+                # Controls are created when the group starts, so a queued group does not spend its max_time
+                controls = [new_control(i) for i in group]
+                return group, self.generate_batch([prompts[i] for i in group], controls), controls
+
+            groups = [window[group_start:group_start + batch_size] for group_start in range(0, len(window), batch_size)]
+            if not self.inference_executor:
+                for group in groups:
+                    yield from zip(*run_group(group))
+                continue
+
+            futures = [self.inference_executor.submit(run_group, group) for group in groups]
+            try:
+                for future in as_completed(futures):
+                    yield from zip(*future.result())
+            finally:
+                # The consumer went away: groups that have not started yet are dropped
+                for future in futures:
+                    future.cancel()
+
+    def generate(self, prompt_parts: PromptParts, control: Optional[GenerationControl] = None) -> str:
+        """One answer, generated by the worker processes, the scheduler or the inference executor."""
+        if self.worker_pool:
+            answer = self.worker_pool.generate(prompt_parts, control)
+            self._record_worker_stop(control)
+            return answer
+        if self.scheduler:
+            return self.scheduler.generate(prompt_parts, control)
+        return self._run_generate_batch([prompt_parts], [control])[0]
+
+    def _run_generate_batch(self, prompts: List[PromptParts], controls: List[Optional[GenerationControl]]) -> List[str]:
+        """generate_batch on the inference executor, within its thread budget, when there is one."""
+        if self.inference_executor:
+            return self.inference_executor.submit(self.generate_batch, prompts, controls).result()
+        return self.generate_batch(prompts, controls)
+
+    def _submit_inference(self, func, *args) -> Future:
+        """Runs `func` on the inference executor, or on a thread of its own without one."""
+        if self.inference_executor:
+            return self.inference_executor.submit(func, *args)
+        future: Future = Future()
+
+        def run():
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        Thread(target=run, daemon=True).start()
+        return future
+
+    def generate_batch(self, prompts: List[PromptParts], controls: Optional[List[Optional[GenerationControl]]] = None) -> List[str]:
+        """Generates one answer per (instructions, question, chunks) prompt."""
+        start = time.perf_counter()
+        if len(prompts) == 1:
+            inputs = self._prepare_inputs(*prompts[0])
+        else:
+            inputs = self._pad_left([
+                self.prompt_builder.build(question, chunks, instructions=instructions)
+                for instructions, question, chunks in prompts
+            ])
+        tokenization_ms = (time.perf_counter() - start) * 1000
+        for control in controls or []:
+            if control is not None:
+                control.timings.add("tokenization", tokenization_ms)
+
+        outputs = self._generate(inputs, controls)
+
+        prompt_length = inputs["input_ids"].shape[1]
+        return [
+            self.tokenizer.decode(output[prompt_length:], skip_special_tokens=True).strip()
+            for output in outputs
+        ]
+
+    def ask_stream(self, prompt: str, instructions: Optional[str] = None, extra_context: Optional[List[str]] = None,
+                   control: Optional[GenerationControl] = None, spaces: Optional[List[str]] = None) -> Iterator[str]:
+        control = control or GenerationControl()
+        use_semantic_cache = self.semantic_cache is not None and instructions is None and not spaces
+        if use_semantic_cache:
+            with control.timings.measure("semantic_cache"):
+                cached_answer, question_embedding = self.semantic_cache.lookup(prompt, self.query_engine.index_version)
+            if cached_answer is not None:
+                yield cached_answer
+                return
+
+        with control.timings.measure("retrieval"):
+            prompt_parts = self._prompt_parts(prompt, instructions, extra_context, spaces, control)
+        with control.timings.measure("tokenization"):
+            inputs = self._prepare_inputs(*prompt_parts)
+
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors: List[Exception] = []
+        generation = self._submit_inference(self._generate_into_streamer, streamer, errors, inputs, control)
+        answer_chunks = []
+        streamer_exhausted = False
+        try:
+            for text in streamer:
+                if text:
+                    answer_chunks.append(text)
+                    yield text
+            streamer_exhausted = True
+        finally:
+            # The consumer stopped iterating before the answer was complete (client gone)
+            if not streamer_exhausted:
+                control.cancel()
+        generation.result()
+        if errors:
+            raise errors[0]
+
+        if use_semantic_cache and not control.stopped_early:
+            self.semantic_cache.store(question_embedding, "".join(answer_chunks).strip(), self.query_engine.index_version)
+
+    def _generate_into_streamer(self, streamer: TextIteratorStreamer, errors: List[Exception], inputs: dict,
+                                control: GenerationControl):
+        try:
+            self._generate(inputs, [control], streamer=streamer)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    def _generate(self, inputs: dict, controls: Optional[List[Optional[GenerationControl]]] = None, **extra_kwargs) -> torch.Tensor:
+        generation_kwargs = dict(**inputs, **self._generation_kwargs(), **extra_kwargs)
+        criteria = None
+        if controls and any(control is not None for control in controls):
+            criteria = GenerationControlCriteria(
+                controls, inputs["input_ids"].shape[1], self._record_stop, finished_token_ids=self._finished_token_ids
             )
+            generation_kwargs["stopping_criteria"] = StoppingCriteriaList([criteria])
+
+        start = time.perf_counter()
+        # Assisted generation in transformers only supports a batch of one
+        if self.draft_model is None or inputs["input_ids"].shape[0] != 1:
+            with torch.no_grad():
+                outputs = self.model.generate(**generation_kwargs)
+        else:
+            with torch.no_grad(), self.assisted_metrics.track() as counts:
+                outputs = self.model.generate(assistant_model=self.draft_model, **generation_kwargs)
+            self.assisted_metrics.record(counts, outputs.shape[1] - inputs["input_ids"].shape[1])
+
+        if criteria is not None:
+            self._record_timings(criteria, inputs, outputs, start, time.perf_counter())
+        return outputs
+
+    def _record_timings(self, criteria: GenerationControlCriteria, inputs: dict, outputs: torch.Tensor,
+                        start: float, end: float):
+        # The first stopping-criteria call comes right after prefill produced the first token
+        first_token_at = criteria.first_token_at or end
+        prompt_length = inputs["input_ids"].shape[1]
+        for row, control in enumerate(criteria.controls):
+            if control is None:
+                continue
+            control.timings.add("prefill", (first_token_at - start) * 1000)
+            control.timings.add("decode", (end - first_token_at) * 1000)
+            control.timings.prompt_tokens = int(inputs["attention_mask"][row].sum())
+            control.timings.generated_tokens = int((outputs[row, prompt_length:] != self.tokenizer.pad_token_id).sum())
+
+    def _prepare_inputs(self, instructions: str, question: str, chunks: List[str]) -> dict:
+        if self.prefix_cache is None:
+            return self._pad_left([self.prompt_builder.build(question, chunks, instructions=instructions)])
+
+        # Only the body is prefilled; generate skips the positions already in past_key_values
+        prefix_ids, past_key_values = self.prefix_cache.get(instructions)
+        body_ids = self.prompt_builder.build(question, chunks, reserved_tokens=prefix_ids.shape[1])
+        input_ids = torch.cat([prefix_ids, torch.tensor([body_ids], device=self.model.device)], dim=1)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            "past_key_values": past_key_values,
+        }
+
+    def _record_stop(self, control: GenerationControl, generated_tokens: int):
+        with self._stats_lock:
+            saved_tokens = max(self.max_new_tokens - generated_tokens, 0)
+            if control.cancelled:
+                self.cancelled_generations += 1
+                self.cancelled_tokens_generated += generated_tokens
+                self.cancelled_tokens_saved += saved_tokens
+            else:
+                self.truncated_generations += 1
+                self.truncated_tokens_generated += generated_tokens
+                self.truncated_tokens_saved += saved_tokens
+
+    def _record_worker_stop(self, control: Optional[GenerationControl]):
+        # The stopping criteria ran in a worker process; count the stop here so generation_stats covers it
+        if control is not None and control.stopped_after_tokens is not None:
+            self._record_stop(control, control.stopped_after_tokens)
+
+    def generation_stats(self) -> dict:
+        return {
+            "cancelled_generations": self.cancelled_generations,
+            "truncated_generations": self.truncated_generations,
+            "cancelled_tokens_generated": self.cancelled_tokens_generated,
+            "cancelled_tokens_saved": self.cancelled_tokens_saved,
+            "truncated_tokens_generated": self.truncated_tokens_generated,
+            "truncated_tokens_saved": self.truncated_tokens_saved,
+        }
+
+    def _pad_left(self, prompt_ids: List[List[int]]) -> dict:
+        # Batched prompts are left-padded so every row ends right where generation starts
+        max_length = max(len(ids) for ids in prompt_ids)
+        input_ids = [[self.tokenizer.pad_token_id] * (max_length - len(ids)) + ids for ids in prompt_ids]
+        attention_mask = [[0] * (max_length - len(ids)) + [1] * len(ids) for ids in prompt_ids]
+        return {
+            "input_ids": torch.tensor(input_ids, device=self.model.device),
+            "attention_mask": torch.tensor(attention_mask, device=self.model.device),
+        }
 
-        answer = self.tokenizer.decode(outputs[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True)
-        return answer.strip()
\ No newline at end of file
+    def _generation_kwargs(self) -> dict:
+        return dict(
+            max_new_tokens=self.max_new_tokens,
+            do_sample=True,
+            temperature=self.temperature,
+            top_p=0.9,
+            pad_token_id=self.tokenizer.pad_token_id
+        )
\ No newline at end of file
@@ -0,0 +1,97 @@
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+import torch
+from transformers import StoppingCriteria
+
+from utils.request_timings import RequestTimings
+
+
+class GenerationControl:
+    """Per-request handle that lets the caller stop a running generation early.
+
+    `max_time` is a wall-clock budget in seconds, counted from when the control is created;
+    once it runs out decoding stops and the partial answer is returned as `truncated`.
+    The control also carries the request's stage timings.
+    """
+
+    def __init__(self, max_time: Optional[float] = None):
+        self._cancelled = threading.Event()
+        self._cancel_callbacks: List[Callable[[], None]] = []
+        self.deadline = time.monotonic() + max_time if max_time else None
+        self.truncated = False
+        # Tokens generated when the stopping criteria stopped this row early; None if it was not stopped
+        self.stopped_after_tokens: Optional[int] = None
+        self.timings = RequestTimings()
+
+    def cancel(self):
+        self._cancelled.set()
+        for callback in self._cancel_callbacks:
+            callback()
+
+    def add_cancel_callback(self, callback: Callable[[], None]):
+        """Forwards a cancellation to work this control cannot stop directly (e.g. another process)."""
+        self._cancel_callbacks.append(callback)
+        if self.cancelled:
+            callback()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def stopped_early(self) -> bool:
+        return self.cancelled or self.truncated
+
+    def should_stop(self) -> bool:
+        if self.cancelled:
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.truncated = True
+        return self.truncated
+
+
+class GenerationControlCriteria(StoppingCriteria):
+    """Stops each batch row whose GenerationControl asks to stop, leaving the other rows running.
+
+    `on_stop(control, generated_tokens)` is called once per stopped row. The first call happens
+    right after prefill, so it also marks `first_token_at`. Rows that already ended with one of
+    `finished_token_ids` (EOS / padding) are complete and their controls are no longer consulted,
+    so a deadline passing while other rows decode does not mark them truncated.
+    """
+
+    def __init__(self, controls: List[Optional[GenerationControl]], prompt_length: int,
+                 on_stop: Callable[[GenerationControl, int], None], finished_token_ids: Iterable[int] = ()):
+        self.controls = controls
+        self.prompt_length = prompt_length
+        self.on_stop = on_stop
+        self.finished_token_ids = set(finished_token_ids)
+        self._stopped = set()
+        self._finished = set()
+        self.first_token_at: Optional[float] = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        last_tokens = input_ids[:, -1].tolist()
+        stop = []
+        for row, control in enumerate(self.controls):
+            if row in self._stopped or row in self._finished:
+                stop.append(True)
+            elif last_tokens[row] in self.finished_token_ids:
+                self._finished.add(row)
+                stop.append(True)
+            elif control is not None and control.should_stop():
+                self._stopped.add(row)
+                control.stopped_after_tokens = input_ids.shape[1] - self.prompt_length
+                self.on_stop(control, control.stopped_after_tokens)
+                stop.append(True)
+            else:
+                stop.append(False)
+        return torch.tensor(stop, dtype=torch.bool, device=input_ids.device)
+
+
+def resolve_max_time(requested: Optional[float], endpoint_default: float) -> Optional[float]:
+    """The per-request budget wins over the endpoint default; 0 means no limit."""
+    return endpoint_default if requested is None else requested
@@ -0,0 +1,102 @@
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class GenerationScheduler:
+    """Groups prompts submitted from concurrent requests into a single batched generate call.
+
+    A background thread waits for the first pending prompt, keeps collecting until the batch
+    is full or `max_wait_ms` has elapsed, runs `generate_batch` once and resolves each
+    caller's future with its own answer. Prompts arriving while a batch is decoding are
+    picked up by the next one.
+
+    With an `executor` the batches run on its threads instead (up to `max_concurrent_batches`
+    at a time), so they get that executor's thread budget; the background thread only collects.
+    """
+
+    def __init__(self,
+                 generate_batch: Callable[[List[Any], List[Any]], List[str]],
+                 max_batch_size: int = 8,
+                 max_wait_ms: float = 10.0,
+                 name: str = "GenerationScheduler",
+                 executor: Optional[Executor] = None,
+                 max_concurrent_batches: int = 1):
+        self.generate_batch = generate_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self.batches_run = 0
+        self.prompts_served = 0
+        self._executor = executor
+        self._batch_slots = threading.Semaphore(max_concurrent_batches)
+
+        self._queue: "queue.Queue[Tuple[Any, Any, Future]]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+        print(f"{name} started. max_batch_size={max_batch_size}, max_wait_ms={max_wait_ms}")
+
+    def submit(self, prompt: Any, control: Any = None) -> Future:
+        """Queues `prompt`; `control` is handed to `generate_batch` alongside it."""
+        if self._stopped.is_set():
+            raise RuntimeError(f"{self.name} has been shut down.")
+        future: Future = Future()
+        self._queue.put((prompt, control, future))
+        return future
+
+    def generate(self, prompt: Any, control: Any = None) -> str:
+        return self.submit(prompt, control).result()
+
+    def shutdown(self):
+        self._stopped.set()
+        self._worker.join()
+
+    def _collect_batch(self) -> List[Tuple[Any, Any, Future]]:
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            # A free slot is taken before collecting, so prompts keep queueing (and batches grow)
+            # while every executor thread is busy
+            if not self._batch_slots.acquire(timeout=0.1):
+                continue
+            batch = self._collect_batch()
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                self._batch_slots.release()
+                continue
+            if self._executor is None:
+                self._run_batch(batch)
+            else:
+                self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[Tuple[Any, Any, Future]]):
+        try:
+            answers = self.generate_batch([prompt for prompt, _, _ in batch], [control for _, control, _ in batch])
+        except Exception as e:
+            print(f"{self.name}: error in batch of {len(batch)}: {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            self._batch_slots.release()
+
+        self.batches_run += 1
+        self.prompts_served += len(batch)
+        for (_, _, future), answer in zip(batch, answers):
+            future.set_result(answer)
@@ -0,0 +1,186 @@
+import itertools
+import multiprocessing as mp
+import threading
+from concurrent.futures import Future
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+from models.generation_control import GenerationControl
+
+
+# Cancellation flags shared with the workers, one byte per request id modulo this size
+_CANCEL_SLOTS = 1 << 16
+
+
+class _SharedCancelControl(GenerationControl):
+    """Worker-side control that is also cancelled by the API process setting its shared flag."""
+
+    def __init__(self, max_time: Optional[float], cancel_flags, slot: int):
+        super().__init__(max_time)
+        self._cancel_flags = cancel_flags
+        self._slot = slot
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or self._cancel_flags[self._slot] == 1
+
+
+def _worker_main(worker_id: int, chatbot_kwargs: dict, num_threads: int, requests, results, cancel_flags):
+    # Imported here so the parent process does not need the worker's import side effects
+    from models.chatbot_model import ChatBot
+
+    torch.set_num_threads(num_threads)
+    chatbot = ChatBot(query_engine=None, **chatbot_kwargs)
+    # Take no more requests off the shared queue than this worker can batch together
+    slots = threading.Semaphore(chatbot.scheduler.max_batch_size if chatbot.scheduler else 1)
+    results.put(("ready", worker_id, None))
+
+    def reply(request_id: int, future: Future, control):
+        error = future.exception()
+        if error:
+            results.put(("error", request_id, repr(error)))
+        else:
+            results.put(("result", request_id, (
+                future.result(), control.truncated, control.stopped_after_tokens, control.timings.snapshot()
+            )))
+        slots.release()
+
+    while True:
+        slots.acquire()
+        item = requests.get()
+        if item is None:
+            break
+        request_id, prompt_parts, max_time = item
+        control = _SharedCancelControl(max_time, cancel_flags, request_id % _CANCEL_SLOTS)
+        if control.cancelled:
+            # Cancelled while still queued: stopped before generating anything
+            results.put(("result", request_id, ("", False, 0, control.timings.snapshot())))
+            slots.release()
+            continue
+        if chatbot.scheduler:
+            chatbot.scheduler.submit(prompt_parts, control).add_done_callback(
+                lambda future, rid=request_id, ctl=control: reply(rid, future, ctl)
+            )
+            continue
+        future = Future()
+        try:
+            future.set_result(chatbot.generate_batch([prompt_parts], [control])[0])
+        except Exception as e:
+            future.set_exception(e)
+        reply(request_id, future, control)
+
+
+class ModelWorkerPool:
+    """Pool of model processes fed from a local IPC queue.
+
+    Each worker builds a generation-only ChatBot with memory-mapped weights, so N workers
+    give N-way CPU parallelism while sharing one copy of the weights in the page cache.
+    Retrieval and prompt assembly inputs are prepared by the caller; workers only generate.
+    """
+
+    def __init__(self, num_workers: int, chatbot_kwargs: dict, threads_per_worker: int = 1):
+        ctx = mp.get_context("spawn")
+        self.num_workers = num_workers
+        self._requests = ctx.Queue()
+        self._results = ctx.Queue()
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Semaphore(0)
+        self._cancel_flags = ctx.Array("b", _CANCEL_SLOTS, lock=False)
+
+        worker_kwargs = dict(chatbot_kwargs, mmap_weights=True)
+        self._processes = [
+            ctx.Process(
+                target=_worker_main,
+                args=(worker_id, worker_kwargs, threads_per_worker, self._requests, self._results, self._cancel_flags),
+                name=f"model-worker-{worker_id}",
+                daemon=True,
+            )
+            for worker_id in range(num_workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self._collector = threading.Thread(target=self._collect, name="model-worker-results", daemon=True)
+        self._collector.start()
+        started = 0
+        while started < num_workers:
+            if self._ready.acquire(timeout=1):
+                started += 1
+            elif any(process.exitcode is not None for process in self._processes):
+                raise RuntimeError("A model worker exited during startup; see its output above.")
+        print(f"ModelWorkerPool ready with {num_workers} workers, {threads_per_worker} threads each.")
+
+    def submit(self, prompt_parts: Any, max_time: Optional[float] = None) -> Future:
+        """Returns a future of (answer, truncated, stopped_after_tokens, timings snapshot)."""
+        return self._enqueue(prompt_parts, max_time)[1]
+
+    def cancel(self, request_id: int):
+        """Stops the request's decoding in whichever worker runs it; its partial answer still comes back."""
+        self._cancel_flags[request_id % _CANCEL_SLOTS] = 1
+
+    def _enqueue(self, prompt_parts: Any, max_time: Optional[float]) -> Tuple[int, Future]:
+        future: Future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        self._cancel_flags[request_id % _CANCEL_SLOTS] = 0
+        self._requests.put((request_id, prompt_parts, max_time))
+        return request_id, future
+
+    def generate(self, prompt_parts: Any, control=None) -> str:
+        return self.generate_async(prompt_parts, control).result()
+
+    def generate_async(self, prompt_parts: Any, control=None) -> Future:
+        """Future of the answer; `control` is updated with the worker's truncation, early stop and timings
+        before it resolves."""
+        # The remaining time budget travels with the request; cancellation through the shared flags
+        max_time = None
+        if control is not None and control.deadline is not None:
+            max_time = max(control.deadline - time.monotonic(), 1e-3)
+        answer_future: Future = Future()
+
+        def resolve(future: Future):
+            if future.exception() is not None:
+                answer_future.set_exception(future.exception())
+                return
+            answer, truncated, stopped_after_tokens, timings = future.result()
+            if control is not None:
+                control.truncated = control.truncated or truncated
+                control.stopped_after_tokens = stopped_after_tokens
+                control.timings.merge(timings)
+            answer_future.set_result(answer)
+
+        request_id, future = self._enqueue(prompt_parts, max_time)
+        if control is not None:
+            control.add_cancel_callback(lambda: self.cancel(request_id))
+        future.add_done_callback(resolve)
+        return answer_future
+
+    def generate_batch(self, prompts: List[Any]) -> List[str]:
+        futures = [self.submit(prompt_parts) for prompt_parts in prompts]
+        return [future.result()[0] for future in futures]
+
+    def shutdown(self):
+        for _ in self._processes:
+            self._requests.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+
+    def _collect(self):
+        while True:
+            kind, key, payload = self._results.get()
+            if kind == "ready":
+                self._ready.release()
+                continue
+            with self._lock:
+                future = self._pending.pop(key, None)
+            if future is None:
+                continue
+            if kind == "error":
+                future.set_exception(RuntimeError(f"Model worker failed: {payload}"))
+            else:
+                future.set_result(payload)
@@ -0,0 +1,44 @@
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Tuple
+
+import torch
+
+
+class PrefixCache:
+    """Keeps the past_key_values of static prompt prefixes (instruction preambles).
+
+    Each prefix is prefilled once per model load; callers get a copy of its cache so
+    `generate` only has to prefill the dynamic part of the prompt.
+    """
+
+    def __init__(self, model, tokenizer, max_entries: int = 16):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[torch.Tensor, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def warm(self, prefix: str):
+        self._get_entry(prefix)
+
+    def get(self, prefix: str) -> Tuple[torch.Tensor, Any]:
+        """Returns (prefix input_ids, a private copy of its past_key_values)."""
+        input_ids, past_key_values = self._get_entry(prefix)
+        return input_ids, copy.deepcopy(past_key_values)
+
+    def _get_entry(self, prefix: str) -> Tuple[torch.Tensor, Any]:
+        with self._lock:
+            if prefix in self._entries:
+                self._entries.move_to_end(prefix)
+                return self._entries[prefix]
+
+            input_ids = self.tokenizer(prefix, return_tensors="pt").input_ids.to(self.model.device)
+            with torch.no_grad():
+                outputs = self.model(input_ids=input_ids, use_cache=True)
+            self._entries[prefix] = (input_ids, outputs.past_key_values)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            print(f"PrefixCache: cached {input_ids.shape[1]} prefix tokens ({len(self._entries)} prefixes).")
+            return self._entries[prefix]
@@ -0,0 +1,43 @@
+from typing import List, Optional
+
+CONTEXT_HEADER = "Contexto Fornecido:\n"
+CHUNK_SEPARATOR = "\n\n"
+
+
+def question_section(question: str) -> str:
+    return f"Pergunta do Usuário:\n{question}\n\nResposta Assistente:"
+
+
+class PromptBuilder:
+    """Assembles prompt token ids section by section within a token budget.
+
+    All sections are tokenized in a single tokenizer call. The instructions and the
+    question are always kept whole; context chunks are added in the order given (best
+    score first) while they fit, and the first chunk that does not fit is cut to the
+    remaining budget when at least `min_chunk_tokens` are left.
+    """
+
+    def __init__(self, tokenizer, max_prompt_tokens: int = 1024, min_chunk_tokens: int = 32):
+        self.tokenizer = tokenizer
+        self.max_prompt_tokens = max_prompt_tokens
+        self.min_chunk_tokens = min_chunk_tokens
+        self._separator_ids = tokenizer(CHUNK_SEPARATOR, add_special_tokens=False)["input_ids"]
+
+    def build(self, question: str, chunks: List[str], instructions: Optional[str] = None, reserved_tokens: int = 0) -> List[int]:
+        """Prompt token ids; pass `reserved_tokens` instead of `instructions` when their ids come from elsewhere."""
+        sections = [instructions or "", CONTEXT_HEADER, question_section(question)]
+        sections += [chunk + CHUNK_SEPARATOR for chunk in chunks]
+        instruction_ids, header_ids, question_ids, *chunk_ids = self.tokenizer(sections, add_special_tokens=False)["input_ids"]
+
+        budget = self.max_prompt_tokens - reserved_tokens - len(instruction_ids) - len(header_ids) - len(question_ids)
+        context_ids: List[int] = []
+        for ids in chunk_ids:
+            remaining = budget - len(context_ids)
+            if len(ids) <= remaining:
+                context_ids.extend(ids)
+                continue
+            if remaining >= self.min_chunk_tokens:
+                context_ids.extend(ids[:remaining - len(self._separator_ids)] + self._separator_ids)
+            break
+
+        return instruction_ids + header_ids + context_ids + question_ids
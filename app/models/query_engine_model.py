@@ -1,13 +1,133 @@
-from llama_index.core import VectorStoreIndex
+from typing import List, NamedTuple, Optional, Tuple
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from services.near_duplicates import hamming_distance, node_simhash
+from services.query_embedding_batcher import embed_query_batch
+from services.space_shards import ShardedRetriever
+
+
+class RetrievedChunk(NamedTuple):
+    text: str
+    source_path: Optional[str]
+    score: float
+    # Near-duplicates of this chunk that ranked within similarity_top_k and were left out of the context
+    duplicates: Tuple[str, ...] = ()
+
 
 class QueryEngine:
-    def __init__(self, index: VectorStoreIndex, llm=None): # Added default llm=None for now
-        self.index = index
+    def __init__(self, index: Optional[VectorStoreIndex], llm=None, index_version: str = None, similarity_top_k: int = 2,
+                 retriever: Optional[BaseRetriever] = None, reranker: Optional[BaseNodePostprocessor] = None,
+                 rerank_candidates: int = 10, near_duplicate_distance: Optional[int] = None,
+                 dedup_candidates: int = 6): # Added default llm=None for now
         self.llm = llm
+        self.similarity_top_k = similarity_top_k
+        # With a reranker the retriever fetches `rerank_candidates` nodes and the reranker keeps the best
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        # With dedup, chunks whose SimHash is within `near_duplicate_distance` bits of a better-scored
+        # chunk are dropped and their slots backfilled from `dedup_candidates` retrieved nodes
+        self.near_duplicate_distance = near_duplicate_distance
+        self.dedup_candidates = dedup_candidates
+        self.set_index(index, index_version, retriever)
+
+    def set_index(self, index: Optional[VectorStoreIndex], index_version: str, retriever: Optional[BaseRetriever] = None):
+        """`retriever` replaces the index's default (brute-force) vector retriever, e.g. an AnnRetriever.
+
+        `index` may be None when the retriever does not need it (MmapRetriever).
+        """
+        # The retriever and synthesizer are built once per index rather than on every query
+        if self.reranker:
+            retrieval_top_k = self.rerank_candidates
+        elif self.near_duplicate_distance is not None:
+            retrieval_top_k = self.dedup_candidates
+        else:
+            retrieval_top_k = self.similarity_top_k
+        retriever = retriever or index.as_retriever(similarity_top_k=retrieval_top_k)
+        self._query_engine = RetrieverQueryEngine.from_args(
+            retriever, llm=self.llm, node_postprocessors=[self.reranker] if self.reranker else None
+        )
+        self.index = index
+        self._index_version = index_version
+
+    @property
+    def index_version(self) -> str:
+        """Keys the semantic and response caches; includes the generation of every space shard, which
+        can be rebuilt while the server runs."""
+        if isinstance(self.retriever, ShardedRetriever):
+            return f"{self._index_version}:{self.retriever.version}"
+        return self._index_version
+
+    @property
+    def retriever(self):
+        return self._query_engine.retriever
+
+    @property
+    def available_spaces(self) -> Optional[List[str]]:
+        """Space keys `retrieve` can filter on; None when the index is not sharded by space."""
+        return list(self.retriever.shards) if isinstance(self.retriever, ShardedRetriever) else None
 
     def query(self, user_input: str) -> str:
-        # llm parameter might be passed from config or ChatBot initialization
-        query_engine = self.index.as_query_engine(llm=self.llm, similarity_top_k=2) # similarity_top_k could be configurable
-        response = query_engine.query(user_input)
+        response = self._query_engine.query(user_input)
         return str(response)
 
+    def retrieve(self, user_input: str, spaces: Optional[List[str]] = None) -> List[RetrievedChunk]:
+        """Scored chunks straight from the retriever (and reranker), best score first; no response synthesis.
+
+        `spaces` limits the search to those space keys and needs a ShardedRetriever.
+        """
+        return self._to_chunks(self._retrieve_nodes(QueryBundle(query_str=user_input), spaces), user_input)
+
+    def retrieve_batch(self, user_inputs: List[str], spaces: Optional[List[str]] = None) -> List[List[RetrievedChunk]]:
+        """`retrieve` for many questions: they are embedded in one batch, and retrievers with a
+        `retrieve_batch` method (mmap, ANN) also search them together."""
+        embeddings = embed_query_batch(Settings.embed_model, user_inputs)
+        query_bundles = [QueryBundle(query_str=user_input, embedding=embedding) for user_input, embedding in zip(user_inputs, embeddings)]
+        if not spaces and hasattr(self.retriever, "retrieve_batch"):
+            nodes_per_query = self.retriever.retrieve_batch(query_bundles)
+        else:
+            nodes_per_query = [self._retrieve_nodes(query_bundle, spaces) for query_bundle in query_bundles]
+        return [self._to_chunks(nodes, user_input) for nodes, user_input in zip(nodes_per_query, user_inputs)]
+
+    def _retrieve_nodes(self, query_bundle: QueryBundle, spaces: Optional[List[str]]) -> List[NodeWithScore]:
+        if not spaces:
+            return self.retriever.retrieve(query_bundle)
+        if not isinstance(self.retriever, ShardedRetriever):
+            raise ValueError("Filtering by space requires SPACE_SHARDS_ENABLED.")
+        return self.retriever.retrieve_spaces(query_bundle, spaces)
+
+    def _to_chunks(self, nodes: List[NodeWithScore], user_input: str) -> List[RetrievedChunk]:
+        if self.reranker:
+            nodes = self.reranker.postprocess_nodes(nodes, query_str=user_input)
+        nodes = sorted(nodes, key=lambda node: node.score or 0.0, reverse=True)
+        if self.near_duplicate_distance is not None:
+            return self._without_near_duplicates(nodes)
+        return [self._to_chunk(node) for node in nodes]
+
+    def _without_near_duplicates(self, nodes: List[NodeWithScore]) -> List[RetrievedChunk]:
+        """The first `similarity_top_k` mutually distinct nodes, in score order."""
+        kept: List[Tuple[NodeWithScore, int, List[str]]] = []
+        for rank, node in enumerate(nodes):
+            if len(kept) == self.similarity_top_k:
+                break
+            signature = node_simhash(node.node)
+            original = next(
+                (entry for entry in kept if hamming_distance(signature, entry[1]) <= self.near_duplicate_distance), None
+            )
+            if original is None:
+                kept.append((node, signature, []))
+            elif rank < self.similarity_top_k:
+                original[2].append(node.node.get_content(metadata_mode=MetadataMode.NONE))
+        return [self._to_chunk(node, tuple(duplicates)) for node, _, duplicates in kept]
+
+    @staticmethod
+    def _to_chunk(node: NodeWithScore, duplicates: Tuple[str, ...] = ()) -> RetrievedChunk:
+        return RetrievedChunk(
+            text=node.node.get_content(metadata_mode=MetadataMode.NONE),
+            source_path=node.node.metadata.get("file_path"),
+            score=node.score or 0.0,
+            duplicates=duplicates,
+        )
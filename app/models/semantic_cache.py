@@ -0,0 +1,85 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    """Answer cache matched by cosine similarity between question embeddings.
+
+    Entries are evicted least-recently-used once `max_entries` is reached, expire after
+    `ttl_seconds`, and are all dropped when the index version they were answered against
+    changes.
+    """
+
+    def __init__(self, embed_model, threshold: float = 0.95, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, str, float]]" = OrderedDict()
+        self._ids = itertools.count()
+        self._index_version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def lookup(self, question: str, index_version: Optional[str] = None) -> Tuple[Optional[str], np.ndarray]:
+        """Returns (cached answer or None, normalized question embedding)."""
+        embedding = self._embed(question)
+        with self._lock:
+            self._check_index_version(index_version)
+            self._expire()
+            if self._entries:
+                entry_ids = list(self._entries.keys())
+                similarities = np.stack([self._entries[i][0] for i in entry_ids]) @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id = entry_ids[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return self._entries[entry_id][1], embedding
+            self.misses += 1
+            return None, embedding
+
+    def store(self, embedding: np.ndarray, answer: str, index_version: Optional[str] = None):
+        with self._lock:
+            self._check_index_version(index_version)
+            self._entries[next(self._ids)] = (embedding, answer, time.monotonic())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _embed(self, question: str) -> np.ndarray:
+        embedding = np.asarray(self.embed_model.get_query_embedding(question), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _check_index_version(self, index_version: Optional[str]):
+        if index_version != self._index_version:
+            if self._entries:
+                print(f"SemanticCache: index version changed ({self._index_version} -> {index_version}), clearing {len(self._entries)} entries.")
+            self._entries.clear()
+            self._index_version = index_version
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired: List[int] = [i for i, (_, _, created_at) in self._entries.items() if created_at < cutoff]
+        for entry_id in expired:
+            del self._entries[entry_id]
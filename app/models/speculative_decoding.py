@@ -0,0 +1,61 @@
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+
+class AssistedGenerationMetrics:
+    """Acceptance statistics for assisted (speculative) generation.
+
+    Forward pre-hooks count target and draft model passes made by the thread running an
+    assisted `generate`. Every target pass verifies the pending draft tokens and adds one
+    token of its own, so accepted draft tokens = generated tokens - target passes, while
+    each draft pass proposes one token.
+    """
+
+    def __init__(self, model, draft_model):
+        self.generations = 0
+        self.generated_tokens = 0
+        self.target_forwards = 0
+        self.draft_forwards = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        model.register_forward_pre_hook(self._on_target_forward)
+        draft_model.register_forward_pre_hook(self._on_draft_forward)
+
+    def _on_target_forward(self, module, args):
+        counts = getattr(self._local, "counts", None)
+        if counts is not None:
+            counts[0] += 1
+
+    def _on_draft_forward(self, module, args):
+        counts = getattr(self._local, "counts", None)
+        if counts is not None:
+            counts[1] += 1
+
+    @contextmanager
+    def track(self) -> Iterator[List[int]]:
+        counts = [0, 0]
+        self._local.counts = counts
+        try:
+            yield counts
+        finally:
+            self._local.counts = None
+
+    def record(self, counts: List[int], generated_tokens: int):
+        with self._lock:
+            self.generations += 1
+            self.generated_tokens += generated_tokens
+            self.target_forwards += counts[0]
+            self.draft_forwards += counts[1]
+
+    def stats(self) -> dict:
+        accepted = max(self.generated_tokens - self.target_forwards, 0)
+        return {
+            "generations": self.generations,
+            "generated_tokens": self.generated_tokens,
+            "target_forwards": self.target_forwards,
+            "draft_tokens_proposed": self.draft_forwards,
+            "draft_tokens_accepted": accepted,
+            "acceptance_rate": accepted / self.draft_forwards if self.draft_forwards else 0.0,
+            "tokens_per_target_forward": self.generated_tokens / self.target_forwards if self.target_forwards else 0.0,
+        }
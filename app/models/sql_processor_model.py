@@ -1,4 +1,6 @@
 import sqlglot
+import hashlib
+import json
 from typing import List, Tuple, Optional, Any
 from services.sql_service import (
     validate_syntax_sqlglot,
@@ -14,25 +16,27 @@ from views.schemas import (
 )
 from config import settings
 from models.chatbot_model import ChatBot
+from models.generation_control import GenerationControl
+from fastapi.concurrency import run_in_threadpool
 
 class LLMClient:
     def __init__(self, chatbot: ChatBot):
         self.chatbot = chatbot
         print(f"LLM Client Initialized with ChatBot model")
 
-    def generate_sql_from_prompt(self, prompt: str, dialect: str, db_schema_context: Optional[str] = None) -> str:
-        context_info = ""
-        if db_schema_context:
-            context_info = f"\nEsquema do banco de dados:\n{db_schema_context}\n\n"
+    def generate_sql_from_prompt(self, prompt: str, dialect: str, db_schema_context: Optional[str] = None,
+                                 control: Optional[GenerationControl] = None, spaces: Optional[List[str]] = None) -> str:
+        # The schema goes in as a context chunk so it is trimmed to the prompt budget, never the description
+        extra_context = [f"Esquema do banco de dados:\n{db_schema_context}"] if db_schema_context else None
             
-        final_prompt = (
+        # Static per dialect, so the ChatBot prefix cache prefills it only once
+        instructions = (
             f"Você é um especialista em SQL. Gere um script SQL válido para o dialeto {dialect} "
-            f"com base na seguinte descrição:\n\n{prompt}\n\n"
-            f"{context_info}"
-            f"Retorne apenas o código SQL sem explicações adicionais."
+            f"com base na descrição do usuário. "
+            f"Retorne apenas o código SQL sem explicações adicionais.\n\n"
         )
-        
-        generated_sql = self.chatbot.ask(final_prompt)
+        generated_sql = self.chatbot.ask(prompt, instructions=instructions, extra_context=extra_context, control=control,
+                                         spaces=spaces)
         
         import re
         sql_code_pattern = r"```sql\s*([\s\S]*?)\s*```"
@@ -49,21 +53,22 @@ class LLMClient:
             
             return '\n'.join(sql_lines).strip()
 
-    def alter_sql_from_prompt(self, original_sql: str, alter_prompt: str, dialect: str, db_schema_context: Optional[str] = None) -> str:
-        context_info = ""
-        if db_schema_context:
-            context_info = f"\nEsquema do banco de dados:\n{db_schema_context}\n\n"
+    def alter_sql_from_prompt(self, original_sql: str, alter_prompt: str, dialect: str, db_schema_context: Optional[str] = None,
+                              control: Optional[GenerationControl] = None, spaces: Optional[List[str]] = None) -> str:
+        extra_context = [f"Esquema do banco de dados:\n{db_schema_context}"] if db_schema_context else None
             
+        instructions = (
+            f"Você é um especialista em SQL. Modifique o script SQL original para o dialeto {dialect} "
+            f"de acordo com as instruções para alteração. "
+            f"Retorne apenas o código SQL alterado sem explicações adicionais.\n\n"
+        )
         final_prompt = (
-            f"Você é um especialista em SQL. Modifique o seguinte script SQL para o dialeto {dialect} "
-            f"de acordo com as instruções fornecidas:\n\n"
             f"SQL Original:\n```sql\n{original_sql}\n```\n\n"
-            f"Instruções para alteração:\n{alter_prompt}\n\n"
-            f"{context_info}"
-            f"Retorne apenas o código SQL alterado sem explicações adicionais."
+            f"Instruções para alteração:\n{alter_prompt}"
         )
         
-        altered_sql = self.chatbot.ask(final_prompt)
+        altered_sql = self.chatbot.ask(final_prompt, instructions=instructions, extra_context=extra_context, control=control,
+                                        spaces=spaces)
         
         import re
         sql_code_pattern = r"```sql\s*([\s\S]*?)\s*```"
@@ -87,6 +92,9 @@ class SQLProcessor:
         self.db_schema = extract_schema_from_markdown(
             docs_base_dir=getattr(settings, "MARKDOWN_DOCS_PATH", "./data/markdown_docs")
         )
+        self.schema_version = hashlib.sha1(
+            json.dumps(self.db_schema, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
         
         global llm_client
         if chatbot:
@@ -94,7 +102,12 @@ class SQLProcessor:
         
         self.llm_client = llm_client
 
-    async def generate_sql(self, request: SQLGenerateRequest) -> SQLGenerateResponse:
+    async def _run_llm(self, func, *args, **kwargs):
+        # LLM calls block for seconds; keep them off the event loop. The generation itself runs on
+        # the ChatBot's inference executor; this thread only does retrieval and waits
+        return await run_in_threadpool(func, *args, **kwargs)
+
+    async def generate_sql(self, request: SQLGenerateRequest, control: Optional[GenerationControl] = None) -> SQLGenerateResponse:
         try:
             if not self.llm_client:
                 return SQLGenerateResponse(
@@ -106,7 +119,10 @@ class SQLProcessor:
                 )
             
             schema_context_str = str(self.db_schema) if self.db_schema else None
-            raw_sql = self.llm_client.generate_sql_from_prompt(request.prompt, request.dialect, schema_context_str)
+            raw_sql = await self._run_llm(
+                self.llm_client.generate_sql_from_prompt, request.prompt, request.dialect, schema_context_str,
+                control=control, spaces=request.spaces
+            )
 
             is_syntax_valid, parsed_expr, syntax_error = validate_syntax_sqlglot(raw_sql, request.dialect)
             
@@ -133,7 +149,8 @@ class SQLProcessor:
                 message=message,
                 generated_sql=raw_sql,
                 formatted_sql=formatted_sql,
-                validation_errors=validation_details if (not is_syntax_valid or semantic_errors_list) else []
+                validation_errors=validation_details if (not is_syntax_valid or semantic_errors_list) else [],
+                truncated=bool(control and control.truncated)
             )
         except Exception as e:
             return SQLGenerateResponse(
@@ -144,7 +161,7 @@ class SQLProcessor:
                 validation_errors=[SQLValidationDetail(type="system", message=f"Erro: {str(e)}")]
             )
 
-    async def alter_sql(self, request: SQLAlterRequest) -> SQLAlterResponse:
+    async def alter_sql(self, request: SQLAlterRequest, control: Optional[GenerationControl] = None) -> SQLAlterResponse:
         try:
             if not self.llm_client:
                 return SQLAlterResponse(
@@ -156,8 +173,10 @@ class SQLProcessor:
                 )
             
             schema_context_str = str(self.db_schema) if self.db_schema else None
-            altered_sql = self.llm_client.alter_sql_from_prompt(
-                request.original_sql, request.alter_prompt, request.dialect, schema_context_str
+            altered_sql = await self._run_llm(
+                self.llm_client.alter_sql_from_prompt,
+                request.original_sql, request.alter_prompt, request.dialect, schema_context_str,
+                control=control, spaces=request.spaces
             )
 
             is_syntax_valid, parsed_expr, syntax_error = validate_syntax_sqlglot(altered_sql, request.dialect)
@@ -184,7 +203,8 @@ class SQLProcessor:
                 message=message,
                 generated_sql=altered_sql,
                 formatted_sql=formatted_sql,
-                validation_errors=validation_details if (not is_syntax_valid or semantic_errors_list) else []
+                validation_errors=validation_details if (not is_syntax_valid or semantic_errors_list) else [],
+                truncated=bool(control and control.truncated)
             )
         except Exception as e:
             return SQLAlterResponse(
@@ -0,0 +1,176 @@
+import json
+import math
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from services.derived_stores import derived_store_lock, replace_path, staging_path
+
+ANN_BACKENDS = ("none", "hnsw", "ivf")
+ANN_DIR_NAME = "ann"
+
+
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    # Inner product over unit vectors is the cosine similarity SimpleVectorStore scores with
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return np.ascontiguousarray(embeddings / np.where(norms == 0, 1, norms), dtype=np.float32)
+
+
+class AnnIndex:
+    """FAISS approximate nearest-neighbour index over the node embeddings of a VectorStoreIndex.
+
+    `hnsw` trades recall for latency with `ef_search` (build-time: `hnsw_m`, `ef_construction`);
+    `ivf` with `nprobe` out of `nlist` inverted lists (nlist defaults to 4 * sqrt(nodes)).
+    """
+
+    def __init__(self, faiss_index, node_ids: List[str], backend: str):
+        self.faiss_index = faiss_index
+        self.node_ids = node_ids
+        self.backend = backend
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, node_ids: List[str], backend: str, hnsw_m: int = 32,
+              ef_construction: int = 200, nlist: int = 0) -> "AnnIndex":
+        import faiss
+
+        vectors = normalize_embeddings(embeddings)
+        dimension = vectors.shape[1]
+        if backend == "hnsw":
+            faiss_index = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            faiss_index.hnsw.efConstruction = ef_construction
+        elif backend == "ivf":
+            nlist = nlist or max(1, int(4 * math.sqrt(len(vectors))))
+            quantizer = faiss.IndexFlatIP(dimension)
+            faiss_index = faiss.IndexIVFFlat(quantizer, dimension, min(nlist, len(vectors)), faiss.METRIC_INNER_PRODUCT)
+            faiss_index.train(vectors)
+        else:
+            raise ValueError(f"Unknown ANN backend '{backend}'. Expected one of {ANN_BACKENDS[1:]}.")
+        faiss_index.add(vectors)
+        return cls(faiss_index, node_ids, backend)
+
+    @classmethod
+    def load(cls, directory: str, backend: str) -> "AnnIndex":
+        import faiss
+
+        with open(os.path.join(directory, f"{backend}_node_ids.json"), encoding="utf-8") as f:
+            node_ids = json.load(f)
+        return cls(faiss.read_index(os.path.join(directory, f"{backend}.faiss")), node_ids, backend)
+
+    def persist(self, directory: str, build_params: Optional[dict] = None):
+        """Each file is written aside and moved into place: node ids, the index, then the build
+        parameters, so an interrupted persist leaves parameters that force a rebuild."""
+        import faiss
+
+        os.makedirs(directory, exist_ok=True)
+
+        def write(name: str, write_to):
+            path = os.path.join(directory, name)
+            staging = staging_path(path)
+            write_to(staging)
+            replace_path(staging, path)
+
+        write(f"{self.backend}_node_ids.json", lambda path: _write_json(path, self.node_ids))
+        write(f"{self.backend}.faiss", lambda path: faiss.write_index(self.faiss_index, path))
+        if build_params is not None:
+            write(f"{self.backend}_params.json", lambda path: _write_json(path, build_params))
+
+    def set_search_params(self, ef_search: Optional[int] = None, nprobe: Optional[int] = None):
+        if self.backend == "hnsw" and ef_search:
+            self.faiss_index.hnsw.efSearch = ef_search
+        elif self.backend == "ivf" and nprobe:
+            self.faiss_index.nprobe = nprobe
+
+    def search(self, query_embedding, top_k: int) -> List[Tuple[str, float]]:
+        return self.search_batch([query_embedding], top_k)[0]
+
+    def search_batch(self, query_embeddings, top_k: int) -> List[List[Tuple[str, float]]]:
+        scores, positions = self.faiss_index.search(normalize_embeddings(np.asarray(query_embeddings, dtype=np.float32)), top_k)
+        return [
+            [(self.node_ids[position], float(score)) for position, score in zip(row_positions, row_scores) if position != -1]
+            for row_positions, row_scores in zip(positions, scores)
+        ]
+
+
+class AnnRetriever(BaseRetriever):
+    """LlamaIndex retriever that searches an AnnIndex and resolves the hits from the index docstore."""
+
+    def __init__(self, ann_index: AnnIndex, vector_index: VectorStoreIndex, similarity_top_k: int = 2):
+        super().__init__()
+        self.ann_index = ann_index
+        self.docstore = vector_index.docstore
+        self.similarity_top_k = similarity_top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        query_embedding = query_bundle.embedding or Settings.embed_model.get_query_embedding(query_bundle.query_str)
+        hits = self.ann_index.search(query_embedding, self.similarity_top_k)
+        return [NodeWithScore(node=self.docstore.get_node(node_id), score=score) for node_id, score in hits]
+
+    def retrieve_batch(self, query_bundles: List[QueryBundle]) -> List[List[NodeWithScore]]:
+        """One faiss search for all the (already embedded) queries."""
+        hits = self.ann_index.search_batch([query_bundle.embedding for query_bundle in query_bundles], self.similarity_top_k)
+        return [
+            [NodeWithScore(node=self.docstore.get_node(node_id), score=score) for node_id, score in query_hits]
+            for query_hits in hits
+        ]
+
+
+def _write_json(path: str, value):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+
+
+def _vector_store_embeddings(vector_index: VectorStoreIndex) -> Tuple[List[str], np.ndarray]:
+    embedding_dict = vector_index.vector_store.data.embedding_dict
+    node_ids = list(embedding_dict.keys())
+    return node_ids, np.asarray([embedding_dict[node_id] for node_id in node_ids], dtype=np.float32)
+
+
+def _build_params(backend: str, hnsw_m: int, ef_construction: int, nlist: int) -> dict:
+    # Only the settings that shape the persisted index; search-time ef_search/nprobe apply on load
+    if backend == "hnsw":
+        return {"hnsw_m": hnsw_m, "ef_construction": ef_construction}
+    return {"nlist": nlist}
+
+
+def _persisted_build_params(params_path: str) -> Optional[dict]:
+    if not os.path.exists(params_path):
+        return None
+    with open(params_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_or_load_ann_index(vector_index: VectorStoreIndex, vector_store_persist_dir: str, backend: str,
+                            hnsw_m: int = 32, ef_construction: int = 200, nlist: int = 0) -> AnnIndex:
+    """Loads the ANN index persisted under VECTOR_STORE_PATH/ann, rebuilding it when the vector store is newer
+    or the index was built with different build parameters."""
+    ann_dir = os.path.join(vector_store_persist_dir, ANN_DIR_NAME)
+    params = _build_params(backend, hnsw_m, ef_construction, nlist)
+    with derived_store_lock(vector_store_persist_dir):
+        if _ann_index_is_current(vector_store_persist_dir, backend, params):
+            print(f"Loading {backend} ANN index from: {ann_dir}")
+            return AnnIndex.load(ann_dir, backend)
+
+        node_ids, embeddings = _vector_store_embeddings(vector_index)
+        print(f"Building {backend} ANN index over {len(node_ids)} nodes...")
+        ann_index = AnnIndex.build(embeddings, node_ids, backend, hnsw_m=hnsw_m, ef_construction=ef_construction, nlist=nlist)
+        ann_index.persist(ann_dir, params)
+        print(f"ANN index persisted to: {ann_dir}")
+        return ann_index
+
+
+def _ann_index_is_current(vector_store_persist_dir: str, backend: str, params: dict) -> bool:
+    ann_dir = os.path.join(vector_store_persist_dir, ANN_DIR_NAME)
+    ann_path = os.path.join(ann_dir, f"{backend}.faiss")
+    vector_store_path = os.path.join(vector_store_persist_dir, "default__vector_store.json")
+    if not os.path.exists(ann_path):
+        return False
+    if os.path.exists(vector_store_path) and os.path.getmtime(ann_path) < os.path.getmtime(vector_store_path):
+        return False
+    if _persisted_build_params(os.path.join(ann_dir, f"{backend}_params.json")) != params:
+        print(f"{backend} ANN index at {ann_dir} was built with different parameters; rebuilding.")
+        return False
+    return True
@@ -0,0 +1,146 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from llama_index.core import VectorStoreIndex
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore, QueryBundle
+
+from services.derived_stores import derived_store_lock, replace_path, staging_path
+
+BM25_DIR_NAME = "bm25"
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, accent-folded word tokens. Identifiers such as t_xpr_promotional_codes are kept
+    whole and also split on underscores, so both the exact name and its parts match."""
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    tokens = []
+    for token in _TOKEN_RE.findall(folded):
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over node text with precomputed postings.
+
+    Every posting stores its final BM25 term weight, so scoring a query is one vectorized
+    scatter-add per query term over that term's postings. Postings are two flat arrays opened with
+    np.load(mmap_mode="r"); `vocabulary` maps each term to its (start, length) slice.
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "vocabulary.json"), encoding="utf-8") as f:
+            self.vocabulary: Dict[str, Tuple[int, int]] = json.load(f)
+        with open(os.path.join(directory, "node_ids.json"), encoding="utf-8") as f:
+            self.node_ids: List[str] = json.load(f)
+        self.posting_nodes = np.load(os.path.join(directory, "posting_nodes.npy"), mmap_mode="r")
+        self.posting_weights = np.load(os.path.join(directory, "posting_weights.npy"), mmap_mode="r")
+
+    @staticmethod
+    def build(directory: str, node_ids: List[str], texts: List[str], k1: float = 1.2, b: float = 0.75):
+        term_counts = [Counter(tokenize(text)) for text in texts]
+        lengths = np.asarray([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) else 0.0
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for position, counts in enumerate(term_counts):
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((position, count))
+
+        vocabulary, posting_nodes, posting_weights = {}, [], []
+        for term, entries in postings.items():
+            idf = math.log(1 + (len(texts) - len(entries) + 0.5) / (len(entries) + 0.5))
+            vocabulary[term] = (len(posting_nodes), len(entries))
+            for position, count in entries:
+                norm = k1 * (1 - b + b * lengths[position] / average_length)
+                posting_nodes.append(position)
+                posting_weights.append(idf * count * (k1 + 1) / (count + norm))
+
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "posting_nodes.npy"), np.asarray(posting_nodes, dtype=np.int32))
+        np.save(os.path.join(directory, "posting_weights.npy"), np.asarray(posting_weights, dtype=np.float32))
+        with open(os.path.join(directory, "node_ids.json"), "w", encoding="utf-8") as f:
+            json.dump(node_ids, f)
+        # Written last: its presence marks a complete index
+        with open(os.path.join(directory, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(vocabulary, f, ensure_ascii=False)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        scores = np.zeros(len(self.node_ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term in self.vocabulary:
+                start, length = self.vocabulary[term]
+                scores[self.posting_nodes[start:start + length]] += self.posting_weights[start:start + length]
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched])]
+        return [(self.node_ids[position], float(scores[position])) for position in matched]
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses a dense retriever's ranking with BM25 through reciprocal rank fusion.
+
+    Each side contributes 1 / (rrf_k + rank) per node; the dense retriever should return more
+    candidates than `similarity_top_k` so the fusion has something to choose from. Nodes found
+    only lexically are resolved with `node_lookup(node_id)`.
+    """
+
+    def __init__(self, vector_retriever: BaseRetriever, bm25_index: BM25Index, node_lookup: Callable[[str], BaseNode],
+                 similarity_top_k: int = 2, candidate_k: int = 20, rrf_k: int = 60):
+        super().__init__()
+        self.vector_retriever = vector_retriever
+        self.bm25_index = bm25_index
+        self.node_lookup = node_lookup
+        self.similarity_top_k = similarity_top_k
+        self.candidate_k = candidate_k
+        self.rrf_k = rrf_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        fused: Dict[str, float] = {}
+        nodes: Dict[str, BaseNode] = {}
+        for rank, hit in enumerate(self.vector_retriever.retrieve(query_bundle)):
+            nodes[hit.node.node_id] = hit.node
+            fused[hit.node.node_id] = fused.get(hit.node.node_id, 0.0) + 1 / (self.rrf_k + rank + 1)
+        for rank, (node_id, _) in enumerate(self.bm25_index.search(query_bundle.query_str, self.candidate_k)):
+            fused[node_id] = fused.get(node_id, 0.0) + 1 / (self.rrf_k + rank + 1)
+
+        best = sorted(fused, key=fused.get, reverse=True)[:self.similarity_top_k]
+        return [NodeWithScore(node=nodes.get(node_id) or self.node_lookup(node_id), score=fused[node_id]) for node_id in best]
+
+
+def bm25_index_is_current(vector_store_persist_dir: str) -> bool:
+    vocabulary_path = os.path.join(vector_store_persist_dir, BM25_DIR_NAME, "vocabulary.json")
+    docstore_path = os.path.join(vector_store_persist_dir, "docstore.json")
+    if not os.path.exists(vocabulary_path):
+        return False
+    return not os.path.exists(docstore_path) or os.path.getmtime(vocabulary_path) >= os.path.getmtime(docstore_path)
+
+
+def build_bm25_index(vector_index: VectorStoreIndex, vector_store_persist_dir: str):
+    directory = os.path.join(vector_store_persist_dir, BM25_DIR_NAME)
+    with derived_store_lock(vector_store_persist_dir):
+        # Another worker may have built it while this one waited for the lock
+        if bm25_index_is_current(vector_store_persist_dir):
+            return
+        nodes = list(vector_index.docstore.docs.values())
+        print(f"Building BM25 index over {len(nodes)} nodes...")
+        staging = staging_path(directory)
+        BM25Index.build(
+            staging,
+            [node.node_id for node in nodes],
+            [node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes],
+        )
+        replace_path(staging, directory)
+    print(f"BM25 index persisted to: {directory}")
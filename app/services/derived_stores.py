@@ -0,0 +1,40 @@
+import os
+import shutil
+from contextlib import contextmanager
+
+_LOCK_FILE_NAME = ".derived_stores.lock"
+
+
+@contextmanager
+def derived_store_lock(vector_store_persist_dir: str):
+    """Serializes checking and building the stores derived from the vector store (ann/, mmap/, bm25/)
+    across the uvicorn workers sharing VECTOR_STORE_PATH; the first builds, the others then load."""
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): only a single worker process is supported there
+        yield
+        return
+
+    os.makedirs(vector_store_persist_dir, exist_ok=True)
+    with open(os.path.join(vector_store_persist_dir, _LOCK_FILE_NAME), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def staging_path(path: str) -> str:
+    """A private path next to `path` to write a new version into before `replace_path` moves it in."""
+    staging = f"{path}.building-{os.getpid()}"
+    if os.path.isdir(staging):
+        shutil.rmtree(staging)
+    return staging
+
+
+def replace_path(staging: str, path: str):
+    """Moves a completely written file or directory into place, so a half-written store is never read."""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(staging, path)
@@ -0,0 +1,44 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+import torch
+
+
+def default_intra_op_threads(workers: int) -> int:
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+class InferenceExecutor:
+    """Dedicated thread pool for model inference, separate from Starlette's shared threadpool.
+
+    Each worker sets its own intra-op thread count when it starts, so `workers` x
+    `intra_op_threads` can be kept at or below the number of cores. The inter-op pool is
+    process wide and can only be sized before PyTorch first uses it. Only model work is
+    submitted here (the ChatBot's generation batches and streams); request handling that
+    waits on it stays on the request threads, so a waiting request never holds a worker.
+    """
+
+    def __init__(self, workers: int = 1, intra_op_threads: int = 0, inter_op_threads: int = 0):
+        self.workers = workers
+        self.intra_op_threads = intra_op_threads or default_intra_op_threads(workers)
+        if inter_op_threads:
+            try:
+                torch.set_num_interop_threads(inter_op_threads)
+            except RuntimeError as e:
+                print(f"Could not set inter-op threads to {inter_op_threads}: {e}")
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="inference",
+            initializer=torch.set_num_threads,
+            initargs=(self.intra_op_threads,)
+        )
+        print(f"InferenceExecutor started. workers={workers}, intra_op_threads={self.intra_op_threads}, "
+              f"inter_op_threads={torch.get_num_interop_threads()}")
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> Future:
+        return self._executor.submit(func, *args, **kwargs)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,155 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+
+from services.ann_index import normalize_embeddings
+from services.derived_stores import derived_store_lock, replace_path, staging_path
+
+MMAP_DIR_NAME = "mmap"
+MMAP_DTYPES = ("float32", "float16")
+_SCORE_BLOCK_ROWS = 16384
+
+
+class MmapVectorStore:
+    """Node embeddings in one contiguous .npy matrix opened with np.load(mmap_mode="r").
+
+    Node text and metadata are concatenated JSON records in `nodes.bin`, addressed through
+    `offsets.npy`, so only the records of the top-k hits are ever read and parsed. Embeddings are
+    stored unit-normalized, making one matrix-vector product the cosine score of every node.
+    """
+
+    def __init__(self, directory: str):
+        self.embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        self._records = np.memmap(os.path.join(directory, "nodes.bin"), dtype=np.uint8, mode="r")
+        self._directory = directory
+        self._positions: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    @staticmethod
+    def build(directory: str, embeddings: np.ndarray, node_ids: List[str], texts: List[str],
+              metadatas: List[dict], dtype: str = "float32"):
+        os.makedirs(directory, exist_ok=True)
+        offsets = [0]
+        with open(os.path.join(directory, "nodes.bin"), "wb") as records:
+            for node_id, text, metadata in zip(node_ids, texts, metadatas):
+                record = json.dumps({"id": node_id, "text": text, "metadata": metadata}, ensure_ascii=False).encode("utf-8")
+                records.write(record)
+                offsets.append(offsets[-1] + len(record))
+        np.save(os.path.join(directory, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        with open(os.path.join(directory, "node_ids.json"), "w", encoding="utf-8") as f:
+            json.dump(node_ids, f)
+        # Written last: its presence marks a complete store
+        np.save(os.path.join(directory, "embeddings.npy"), normalize_embeddings(embeddings).astype(dtype))
+
+    def search(self, query_embedding, top_k: int) -> List[Tuple[int, float]]:
+        return self.search_batch([query_embedding], top_k)[0]
+
+    def search_batch(self, query_embeddings, top_k: int) -> List[List[Tuple[int, float]]]:
+        """Top-k (position, score) per query; one matrix product scores every node against every query."""
+        queries = normalize_embeddings(np.asarray(query_embeddings, dtype=np.float32))
+        if self.embeddings.dtype == np.float32:
+            scores = self.embeddings @ queries.T
+        else:
+            # NumPy has no BLAS path for float16; upcast block by block instead of the whole matrix
+            scores = np.empty((len(self), len(queries)), dtype=np.float32)
+            for start in range(0, len(self), _SCORE_BLOCK_ROWS):
+                block = self.embeddings[start:start + _SCORE_BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ queries.T
+
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return [[] for _ in queries]
+        results = []
+        for query_scores in scores.T:
+            positions = np.argpartition(-query_scores, top_k - 1)[:top_k]
+            positions = positions[np.argsort(-query_scores[positions])]
+            results.append([(int(position), float(query_scores[position])) for position in positions])
+        return results
+
+    def node(self, position: int) -> TextNode:
+        start, end = self.offsets[position], self.offsets[position + 1]
+        record = json.loads(self._records[start:end].tobytes().decode("utf-8"))
+        return TextNode(id_=record["id"], text=record["text"], metadata=record["metadata"])
+
+    def node_by_id(self, node_id: str) -> TextNode:
+        # Only lookups by id (e.g. lexical hits in hybrid retrieval) pay for loading the id map
+        if self._positions is None:
+            with open(os.path.join(self._directory, "node_ids.json"), encoding="utf-8") as f:
+                self._positions = {stored_id: position for position, stored_id in enumerate(json.load(f))}
+        return self.node(self._positions[node_id])
+
+
+class MmapRetriever(BaseRetriever):
+    """LlamaIndex retriever over an MmapVectorStore; needs no VectorStoreIndex or docstore."""
+
+    def __init__(self, store: MmapVectorStore, similarity_top_k: int = 2):
+        super().__init__()
+        self.store = store
+        self.similarity_top_k = similarity_top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        query_embedding = query_bundle.embedding or Settings.embed_model.get_query_embedding(query_bundle.query_str)
+        return [
+            NodeWithScore(node=self.store.node(position), score=score)
+            for position, score in self.store.search(query_embedding, self.similarity_top_k)
+        ]
+
+    def retrieve_batch(self, query_bundles: List[QueryBundle]) -> List[List[NodeWithScore]]:
+        """Scores all the (already embedded) queries in one pass over the matrix."""
+        hits = self.store.search_batch([query_bundle.embedding for query_bundle in query_bundles], self.similarity_top_k)
+        return [
+            [NodeWithScore(node=self.store.node(position), score=score) for position, score in query_hits]
+            for query_hits in hits
+        ]
+
+
+def mmap_store_is_current(vector_store_persist_dir: str, dtype: Optional[str] = None) -> bool:
+    """True when the mmap store exists, is stored as `dtype` (if given) and is not older than the
+    LlamaIndex JSON store it was exported from."""
+    embeddings_path = os.path.join(vector_store_persist_dir, MMAP_DIR_NAME, "embeddings.npy")
+    if not os.path.exists(embeddings_path):
+        return False
+    if dtype is not None and np.load(embeddings_path, mmap_mode="r").dtype != np.dtype(dtype):
+        return False
+    json_paths = [
+        os.path.join(vector_store_persist_dir, name) for name in ("default__vector_store.json", "docstore.json")
+    ]
+    return all(
+        os.path.getmtime(embeddings_path) >= os.path.getmtime(path) for path in json_paths if os.path.exists(path)
+    )
+
+
+def build_or_load_mmap_vector_store(vector_index: Optional[VectorStoreIndex], vector_store_persist_dir: str,
+                                    dtype: str = "float32") -> MmapVectorStore:
+    """Opens VECTOR_STORE_PATH/mmap, exporting it from `vector_index` first when it is missing, stale
+    or stored with a different dtype."""
+    directory = os.path.join(vector_store_persist_dir, MMAP_DIR_NAME)
+    with derived_store_lock(vector_store_persist_dir):
+        if not mmap_store_is_current(vector_store_persist_dir, dtype):
+            if vector_index is None:
+                raise ValueError("The memory-mapped vector store is missing or stale and no VectorStoreIndex was loaded to export it from.")
+            embedding_dict = vector_index.vector_store.data.embedding_dict
+            node_ids = list(embedding_dict.keys())
+            nodes = vector_index.docstore.get_nodes(node_ids)
+            print(f"Exporting {len(node_ids)} nodes to the memory-mapped vector store ({dtype})...")
+            staging = staging_path(directory)
+            MmapVectorStore.build(
+                staging,
+                np.asarray([embedding_dict[node_id] for node_id in node_ids], dtype=np.float32),
+                node_ids,
+                [node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes],
+                [node.metadata for node in nodes],
+                dtype=dtype,
+            )
+            replace_path(staging, directory)
+    store = MmapVectorStore(directory)
+    print(f"Memory-mapped vector store opened from {directory}: {len(store)} nodes, {store.embeddings.dtype}.")
+    return store
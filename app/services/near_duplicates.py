@@ -0,0 +1,47 @@
+import hashlib
+from typing import Any, List, Sequence
+
+import numpy as np
+from llama_index.core.schema import BaseNode, MetadataMode, TransformComponent
+
+from services.bm25_index import tokenize
+
+SIMHASH_METADATA_KEY = "simhash"
+_SHINGLE_SIZE = 3
+_BITS = np.arange(64, dtype=np.uint64)
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word 3-shingles; near-identical texts differ in only a few bits."""
+    tokens = tokenize(text)
+    shingles = [" ".join(tokens[i:i + _SHINGLE_SIZE]) for i in range(max(len(tokens) - _SHINGLE_SIZE + 1, 1))]
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") for shingle in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    bit_counts = ((hashes[:, None] >> _BITS) & np.uint64(1)).sum(axis=0)
+    return sum(1 << int(bit) for bit in np.flatnonzero(2 * bit_counts > len(hashes)))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def node_simhash(node: BaseNode) -> int:
+    """The signature stored at build time, or computed now for nodes indexed before signatures existed."""
+    signature = node.metadata.get(SIMHASH_METADATA_KEY)
+    if signature is None:
+        return simhash(node.get_content(metadata_mode=MetadataMode.NONE))
+    return int(signature, 16)
+
+
+class SimHashSignatures(TransformComponent):
+    """Ingestion step storing each node's SimHash in its metadata, hidden from the embedding and LLM text."""
+
+    def __call__(self, nodes: Sequence[BaseNode], **kwargs: Any) -> List[BaseNode]:
+        for node in nodes:
+            node.metadata[SIMHASH_METADATA_KEY] = format(simhash(node.get_content(metadata_mode=MetadataMode.NONE)), "016x")
+            for excluded_keys in (node.excluded_embed_metadata_keys, node.excluded_llm_metadata_keys):
+                if SIMHASH_METADATA_KEY not in excluded_keys:
+                    excluded_keys.append(SIMHASH_METADATA_KEY)
+        return list(nodes)
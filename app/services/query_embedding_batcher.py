@@ -0,0 +1,75 @@
+from typing import List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from models.generation_scheduler import GenerationScheduler
+
+
+def embed_query_batch(embed_model: BaseEmbedding, queries: List[str]) -> List[Embedding]:
+    """Embeds a list of queries together, through whichever cache/batcher wrappers are configured."""
+    batch_embed = getattr(embed_model, "get_query_embedding_batch", None)
+    if batch_embed is not None:
+        return batch_embed(queries)
+    # HuggingFaceEmbedding applies its query prompt inside _embed, which takes a whole batch
+    embed = getattr(embed_model, "_embed", None)
+    if embed is None:
+        return [embed_model.get_query_embedding(query) for query in queries]
+    return embed(queries, prompt_name="query")
+
+
+class MicroBatchedQueryEmbedding(BaseEmbedding):
+    """Embeds queries from concurrent requests together in one forward pass.
+
+    Queries arriving within `max_wait_ms` of each other (up to `max_batch_size`) are grouped
+    by a GenerationScheduler and the embeddings are fanned back out to each caller. Document
+    (text) embeddings pass straight through; the indexer already batches those.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _scheduler: GenerationScheduler = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        super().__init__(model_name=embed_model.model_name, embed_batch_size=embed_model.embed_batch_size)
+        self._embed_model = embed_model
+        self._scheduler = GenerationScheduler(
+            lambda queries, _controls: self._embed_queries(queries),
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name="QueryEmbeddingBatcher",
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MicroBatchedQueryEmbedding"
+
+    @property
+    def wrapped(self) -> BaseEmbedding:
+        return self._embed_model
+
+    def _embed_queries(self, queries: List[str]) -> List[Embedding]:
+        return embed_query_batch(self._embed_model, queries)
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._scheduler.generate(query)
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[Embedding]:
+        # Already a batch; no need to wait for concurrent requests to join it
+        return self._embed_queries(queries)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed_model.get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed_model.get_text_embedding_batch(texts)
+
+    def stats(self) -> dict:
+        batches, queries = self._scheduler.batches_run, self._scheduler.prompts_served
+        return {
+            "batches_run": batches,
+            "queries_served": queries,
+            "mean_batch_size": queries / batches if batches else 0.0,
+        }
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from services.query_embedding_batcher import embed_query_batch
+from services.response_cache import normalize_prompt
+
+
+class CachedQueryEmbedding(BaseEmbedding):
+    """LRU cache of query embeddings in front of another LlamaIndex embedding model.
+
+    Queries are keyed on (model name, whitespace-normalized text); document (text) embeddings
+    pass straight through. `saved_ms` estimates the time hits saved from the mean miss latency.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _max_entries: int = PrivateAttr()
+    _entries: "OrderedDict[Tuple[str, str], Embedding]" = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+    _miss_ms: float = PrivateAttr(default=0.0)
+
+    def __init__(self, embed_model: BaseEmbedding, max_entries: int = 2048):
+        super().__init__(model_name=embed_model.model_name, embed_batch_size=embed_model.embed_batch_size)
+        self._embed_model = embed_model
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._miss_ms = 0.0
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedQueryEmbedding"
+
+    @property
+    def wrapped(self) -> BaseEmbedding:
+        return self._embed_model
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        key = (self.model_name, normalize_prompt(query))
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return embedding
+
+        start = time.perf_counter()
+        embedding = self._embed_model.get_query_embedding(query)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._misses += 1
+            self._miss_ms += elapsed_ms
+            self._entries[key] = embedding
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return embedding
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[Embedding]:
+        """Cached embeddings for `queries`; the misses are embedded together in one batch."""
+        keys = [(self.model_name, normalize_prompt(query)) for query in queries]
+        with self._lock:
+            embeddings = [self._entries.get(key) for key in keys]
+            for key, embedding in zip(keys, embeddings):
+                if embedding is not None:
+                    self._entries.move_to_end(key)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            with self._lock:
+                self._hits += len(queries)
+            return embeddings
+
+        start = time.perf_counter()
+        for i, embedding in zip(missing, embed_query_batch(self._embed_model, [queries[i] for i in missing])):
+            embeddings[i] = embedding
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._hits += len(queries) - len(missing)
+            self._misses += len(missing)
+            self._miss_ms += elapsed_ms
+            for i in missing:
+                self._entries[keys[i]] = embeddings[i]
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return embeddings
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed_model.get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed_model.get_text_embedding_batch(texts)
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        mean_miss_ms = self._miss_ms / self._misses if self._misses else 0.0
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "saved_ms": self._hits * mean_miss_ms,
+        }
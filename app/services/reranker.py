@@ -0,0 +1,76 @@
+import hashlib
+import threading
+from typing import List, Optional
+
+from cachetools import LRUCache
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from services.response_cache import normalize_prompt
+
+
+class CachedCrossEncoderRerank(BaseNodePostprocessor):
+    """Re-scores retrieved nodes with a sentence-transformers cross-encoder on CPU and keeps `top_n`.
+
+    Scores are cached per (question hash, node id), so repeated or templated questions only run
+    the cross-encoder on nodes they have not been paired with before.
+    """
+
+    model_name: str = Field(description="Cross-encoder model name or path.")
+    top_n: int = Field(default=2, description="Nodes kept after re-ranking.")
+
+    _model = PrivateAttr()
+    _scores: LRUCache = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(self, model_name: str, top_n: int = 2, cache_size: int = 8192):
+        from sentence_transformers import CrossEncoder
+
+        super().__init__(model_name=model_name, top_n=top_n)
+        self._model = CrossEncoder(model_name, device="cpu")
+        self._scores = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedCrossEncoderRerank"
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        if query_bundle is None or not nodes:
+            return nodes[:self.top_n]
+
+        question_hash = hashlib.sha1(normalize_prompt(query_bundle.query_str).encode("utf-8")).hexdigest()
+        keys = [(question_hash, node.node.node_id) for node in nodes]
+        with self._lock:
+            scores = [self._scores.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            pairs = [(query_bundle.query_str, nodes[i].node.get_content(metadata_mode=MetadataMode.NONE)) for i in missing]
+            for i, score in zip(missing, self._model.predict(pairs, show_progress_bar=False)):
+                scores[i] = float(score)
+        with self._lock:
+            self._hits += len(nodes) - len(missing)
+            self._misses += len(missing)
+            for i in missing:
+                self._scores[keys[i]] = scores[i]
+
+        reranked = sorted(
+            (NodeWithScore(node=node.node, score=score) for node, score in zip(nodes, scores)),
+            key=lambda node: node.score,
+            reverse=True,
+        )
+        return reranked[:self.top_n]
+
+    def stats(self) -> dict:
+        pairs = self._hits + self._misses
+        return {
+            "cached_pairs": len(self._scores),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / pairs if pairs else 0.0,
+        }
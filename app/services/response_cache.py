@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from cachetools import TTLCache
+
+
+def normalize_prompt(text: str) -> str:
+    return " ".join(str(text).split())
+
+
+class ResponseCache:
+    """Exact-match cache of endpoint responses.
+
+    Lookups go to an in-process LRU/TTL tier first and, when `sqlite_path` is set, to an
+    on-disk SQLite tier shared by every uvicorn worker and kept across restarts.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 86400, sqlite_path: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.memory_hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+
+        self._memory = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+        self._db = None
+        if sqlite_path:
+            os.makedirs(os.path.dirname(os.path.abspath(sqlite_path)), exist_ok=True)
+            self._db = sqlite3.connect(sqlite_path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - ttl_seconds,))
+            print(f"ResponseCache: SQLite tier at {sqlite_path}")
+
+    @staticmethod
+    def make_key(endpoint: str, *parts: Any) -> str:
+        normalized = [normalize_prompt(part) if isinstance(part, str) else repr(part) for part in parts]
+        return endpoint + ":" + hashlib.sha256("\x1f".join(normalized).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self.memory_hits += 1
+                return value
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM responses WHERE key = ? AND created_at >= ?",
+                    (key, time.time() - self.ttl_seconds)
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._memory[key] = value
+                    self.sqlite_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._memory[key] = value
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), time.time())
+                )
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.sqlite_hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "sqlite_hits": self.sqlite_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.sqlite_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,210 @@
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+from llama_index.core import Settings, StorageContext, VectorStoreIndex, load_index_from_storage
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from services.vector_service import SPACE_KEYS, index_transformations, load_space_documents
+
+SHARDS_DIR_NAME = "spaces"
+CURRENT_FILE_NAME = "CURRENT"
+
+
+class SpaceShard:
+    """The index of one Confluence space, persisted under VECTOR_STORE_PATH/spaces/<space_key>.
+
+    Each build is persisted in a generation directory of its own and `CURRENT` names the live one.
+    The JSON store is only parsed on the first query that reaches this space, and parsed again on
+    the first query after a rebuild moved `CURRENT`, so a running server picks up rebuilt spaces.
+    """
+
+    def __init__(self, space_key: str, shard_dir: str, index: Optional[VectorStoreIndex] = None,
+                 generation: Optional[str] = None):
+        self.space_key = space_key
+        self.shard_dir = shard_dir
+        # (generation, index, retrievers by top_k), swapped as a whole when a new generation is loaded
+        self._loaded: Optional[Tuple[str, VectorStoreIndex, Dict[int, BaseRetriever]]] = (
+            (generation, index, {}) if index is not None else None
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded is not None
+
+    @property
+    def version(self) -> str:
+        """The generation on disk; changes whenever the space is rebuilt."""
+        return current_generation(self.shard_dir)
+
+    @property
+    def index(self) -> VectorStoreIndex:
+        return self._current()[1]
+
+    def _current(self) -> Tuple[str, VectorStoreIndex, Dict[int, BaseRetriever]]:
+        generation = self.version
+        loaded = self._loaded
+        if loaded is None or loaded[0] != generation:
+            with self._lock:
+                loaded = self._loaded
+                if loaded is None or loaded[0] != generation:
+                    persist_dir = _generation_dir(self.shard_dir, generation)
+                    print(f"Loading space shard '{self.space_key}' from {persist_dir}")
+                    index = load_index_from_storage(StorageContext.from_defaults(persist_dir=persist_dir))
+                    loaded = self._loaded = (generation, index, {})
+        return loaded
+
+    def retrieve(self, query_bundle: QueryBundle, top_k: int) -> List[NodeWithScore]:
+        _, index, retrievers = self._current()
+        retriever = retrievers.get(top_k)
+        if retriever is None:
+            retriever = retrievers.setdefault(top_k, index.as_retriever(similarity_top_k=top_k))
+        return retriever.retrieve(query_bundle)
+
+
+class ShardedRetriever(BaseRetriever):
+    """Searches the space shards concurrently and merges their hits by score.
+
+    The question is embedded once and the embedding shared by every shard. `retrieve_spaces`
+    restricts the search to the named spaces; plain `retrieve` searches all of them.
+    """
+
+    def __init__(self, shards: Dict[str, SpaceShard], similarity_top_k: int = 2, max_workers: int = 0):
+        super().__init__()
+        self.shards = shards
+        self.similarity_top_k = similarity_top_k
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(shards) or 1, thread_name_prefix="SpaceShard")
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._search(query_bundle, list(self.shards.values()))
+
+    def retrieve_spaces(self, query: Union[str, QueryBundle], spaces: Optional[List[str]] = None) -> List[NodeWithScore]:
+        if not spaces:
+            return self.retrieve(query)
+        unknown = [space for space in spaces if space not in self.shards]
+        if unknown:
+            raise ValueError(f"Unknown or empty spaces: {', '.join(unknown)}. Available: {', '.join(self.shards)}")
+        query_bundle = QueryBundle(query_str=query) if isinstance(query, str) else query
+        return self._search(query_bundle, [self.shards[space] for space in dict.fromkeys(spaces)])
+
+    def _search(self, query_bundle: QueryBundle, shards: List[SpaceShard]) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = Settings.embed_model.get_query_embedding(query_bundle.query_str)
+        if len(shards) == 1:
+            hits = shards[0].retrieve(query_bundle, self.similarity_top_k)
+        else:
+            hits = [
+                hit
+                for shard_hits in self._executor.map(lambda shard: shard.retrieve(query_bundle, self.similarity_top_k), shards)
+                for hit in shard_hits
+            ]
+        return sorted(hits, key=lambda hit: hit.score or 0.0, reverse=True)[:self.similarity_top_k]
+
+    @property
+    def version(self) -> str:
+        """Combined generation of every shard, for the caches keyed on the index version."""
+        digest = hashlib.sha1()
+        for space_key, shard in sorted(self.shards.items()):
+            digest.update(f"{space_key}:{shard.version};".encode())
+        return digest.hexdigest()[:16]
+
+    def stats(self) -> dict:
+        return {
+            "shards": len(self.shards),
+            "loaded": sorted(key for key, shard in self.shards.items() if shard.loaded),
+        }
+
+
+def _shard_dir(vector_store_persist_dir: str, space_key: str) -> str:
+    return os.path.join(vector_store_persist_dir, SHARDS_DIR_NAME, space_key)
+
+
+def current_generation(shard_dir: str) -> str:
+    """The live generation of a shard; "" for shards persisted directly in their directory, before generations."""
+    try:
+        with open(os.path.join(shard_dir, CURRENT_FILE_NAME), encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def _generation_dir(shard_dir: str, generation: str) -> str:
+    return os.path.join(shard_dir, generation) if generation else shard_dir
+
+
+def _shard_exists(shard_dir: str) -> bool:
+    return os.path.exists(os.path.join(_generation_dir(shard_dir, current_generation(shard_dir)), "docstore.json"))
+
+
+def build_space_shard(docs_base_dir: str, vector_store_persist_dir: str, space_key: str) -> Optional[SpaceShard]:
+    """(Re)builds one space's shard into a new generation, then points `CURRENT` at it.
+
+    `CURRENT` is replaced atomically, so a server loading the shard meanwhile reads either the
+    old generation or the new one. The previous generation is kept for loads already under way;
+    older ones are removed.
+    """
+    documents = load_space_documents(docs_base_dir, space_key)
+    if not documents:
+        return None
+
+    shard_dir = _shard_dir(vector_store_persist_dir, space_key)
+    previous = current_generation(shard_dir)
+    generation = f"{time.time_ns():020x}"  # sorts by build time
+    print(f"Building space shard '{space_key}' from {len(documents)} documents...")
+    index = VectorStoreIndex.from_documents(documents, transformations=index_transformations())
+    index.storage_context.persist(persist_dir=os.path.join(shard_dir, generation))
+
+    current_path = os.path.join(shard_dir, CURRENT_FILE_NAME)
+    staging_path = f"{current_path}.{generation}"
+    with open(staging_path, "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(staging_path, current_path)
+    for name in os.listdir(shard_dir):
+        path = os.path.join(shard_dir, name)
+        if os.path.isdir(path):
+            # Generations newer than the previous one may belong to builds still running
+            if name < (previous or generation):
+                shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith(".json"):
+            # The files of a shard persisted before generations existed
+            os.remove(path)
+    print(f"Space shard '{space_key}' persisted to: {os.path.join(shard_dir, generation)}")
+    return SpaceShard(space_key, shard_dir, index=index, generation=generation)
+
+
+def build_or_load_space_shards(docs_base_dir: str, vector_store_persist_dir: str) -> Dict[str, SpaceShard]:
+    """One shard per space key. Persisted shards are registered without being loaded; missing ones are built."""
+    shards = {}
+    for space_key in SPACE_KEYS:
+        shard_dir = _shard_dir(vector_store_persist_dir, space_key)
+        if _shard_exists(shard_dir):
+            shards[space_key] = SpaceShard(space_key, shard_dir)
+            continue
+        shard = build_space_shard(docs_base_dir, vector_store_persist_dir, space_key)
+        if shard is not None:
+            shards[space_key] = shard
+
+    if not shards:
+        raise ValueError(f"No documents found in any subdirectories of {docs_base_dir}. Cannot build space shards.")
+    print(f"{len(shards)} space shards registered under {os.path.join(vector_store_persist_dir, SHARDS_DIR_NAME)}.")
+    return shards
+
+
+if __name__ == "__main__":
+    # Rebuilds the shards of the given spaces only: python -m services.space_shards PMS POS
+    # A running server loads the new generation on the next query to the space and its index version changes
+    from config import settings
+    from services.vector_service import configure_embed_model
+
+    if len(sys.argv) < 2 or any(key not in SPACE_KEYS for key in sys.argv[1:]):
+        sys.exit(f"Usage: python -m services.space_shards <space_key>... (one of: {', '.join(SPACE_KEYS)})")
+    configure_embed_model(settings.EMBEDDING_MODEL_NAME)
+    for key in sys.argv[1:]:
+        build_space_shard(settings.MARKDOWN_DOCS_PATH, settings.VECTOR_STORE_PATH, key)
@@ -1,4 +1,6 @@
 import os
+import hashlib
+from typing import Optional
 from llama_index.core import (
     VectorStoreIndex, 
     SimpleDirectoryReader, 
@@ -7,62 +9,117 @@ from llama_index.core import (
     load_index_from_storage
 )
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from services.query_embedding_cache import CachedQueryEmbedding
+from services.query_embedding_batcher import MicroBatchedQueryEmbedding
+from services.bm25_index import bm25_index_is_current, build_bm25_index
+from services.near_duplicates import SimHashSignatures
 
-def build_or_load_vector_store(docs_base_dir: str, vector_store_persist_dir: str, embedding_model_name: str) -> VectorStoreIndex:
+SPACE_KEYS = [
+    "ags", "API", "CM", "CME", "CMSup", "CMSupE", "CRS", "CST",
+    "EMS", "HE", "HEYC", "Hstays", "hpn", "MAN", "OMS", "OPA",
+    "PDP", "PDOC", "PMS", "pneng", "pnsup", "POS", "WIKI", "WSS"
+]
 
-    print(f"Attempting to build/load vector store. Docs: {docs_base_dir}, Store: {vector_store_persist_dir}")
+def index_fingerprint(vector_store_persist_dir: str) -> str:
+    """Version string for the persisted index; changes whenever the store is rebuilt.
+
+    Only the LlamaIndex store files directly in the directory count: the derived stores (ann/, mmap/,
+    bm25/) can be written at startup after this is computed, and space shards carry their own
+    generation (ShardedRetriever.version).
+    """
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(vector_store_persist_dir)) if os.path.isdir(vector_store_persist_dir) else []:
+        path = os.path.join(vector_store_persist_dir, name)
+        if name.endswith(".json") and os.path.isfile(path):
+            file_stat = os.stat(path)
+            digest.update(f"{name}:{file_stat.st_size}:{file_stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
 
+def index_transformations() -> list:
+    """The default node parser plus the SimHash signatures used for near-duplicate removal at query time."""
+    return [*Settings.transformations, SimHashSignatures()]
+
+def configure_embed_model(embedding_model_name: str, query_embedding_cache_size: int = 0,
+                          query_embedding_batch_size: int = 1, query_embedding_batch_wait_ms: float = 5.0):
     embed_model = HuggingFaceEmbedding(model_name=embedding_model_name)
+    if query_embedding_batch_size > 1:
+        embed_model = MicroBatchedQueryEmbedding(
+            embed_model, max_batch_size=query_embedding_batch_size, max_wait_ms=query_embedding_batch_wait_ms
+        )
+    if query_embedding_cache_size > 0:
+        embed_model = CachedQueryEmbedding(embed_model, max_entries=query_embedding_cache_size)
     Settings.llm = None
     Settings.embed_model = embed_model
     print(f"LlamaIndex Settings configured: LLM is {'None' if Settings.llm is None else 'Set'}, Embed Model is {Settings.embed_model.model_name}")
 
+def load_space_documents(docs_base_dir: str, space_key: str) -> list:
+    input_dir = os.path.join(docs_base_dir, space_key)
+    if not os.path.exists(input_dir):
+        print(f"Document subdirectory not found, skipping: {input_dir}")
+        return []
+
+    print(f"Loading documents from: {input_dir}")
+    if not any(os.path.isfile(os.path.join(input_dir, f)) for f in os.listdir(input_dir)):
+        print(f"No files found in {input_dir}, skipping.")
+        return []
+
+    try:
+        documents = SimpleDirectoryReader(input_dir).load_data()
+        print(f"Loaded {len(documents)} documents from {input_dir}.")
+        return documents
+    except Exception as e:
+        print(f"Error loading documents from {input_dir}: {e}")
+        return []
+
+def build_or_load_vector_store(docs_base_dir: str, vector_store_persist_dir: str, embedding_model_name: str,
+                               query_embedding_cache_size: int = 0, query_embedding_batch_size: int = 1,
+                               query_embedding_batch_wait_ms: float = 5.0, load_index: bool = True,
+                               build_bm25: bool = False) -> Optional[VectorStoreIndex]:
+    """Configures the embedding model and builds or loads the index.
+
+    With `load_index=False` an existing persisted index is not loaded and None is returned; callers
+    that serve queries from the memory-mapped store use this to skip the JSON load. With `build_bm25`
+    the BM25 index next to the store is (re)built whenever it is missing or older than the docstore.
+    """
+
+    print(f"Attempting to build/load vector store. Docs: {docs_base_dir}, Store: {vector_store_persist_dir}")
+
+    configure_embed_model(embedding_model_name, query_embedding_cache_size, query_embedding_batch_size,
+                          query_embedding_batch_wait_ms)
+
+    if not load_index and os.path.exists(vector_store_persist_dir) and os.listdir(vector_store_persist_dir):
+        print("Skipping load_index_from_storage; queries are served from the memory-mapped vector store.")
+        return None
+
     if os.path.exists(vector_store_persist_dir) and os.listdir(vector_store_persist_dir):
         print(f"Loading existing vector store from: {vector_store_persist_dir}")
         try:
             storage_context = StorageContext.from_defaults(persist_dir=vector_store_persist_dir)
             index = load_index_from_storage(storage_context)
             print("Successfully loaded vector store from storage.")
+            if build_bm25 and not bm25_index_is_current(vector_store_persist_dir):
+                build_bm25_index(index, vector_store_persist_dir)
             return index
         except Exception as e:
             print(f"Error loading from storage, will attempt to rebuild: {e}")
 
     print(f"No valid existing vector store found or error loading. Building new one from: {docs_base_dir}")
-    space_keys = [
-        "ags", "API", "CM", "CME", "CMSup", "CMSupE", "CRS", "CST",
-        "EMS", "HE", "HEYC", "Hstays", "hpn", "MAN", "OMS", "OPA",
-        "PDP", "PDOC", "PMS", "pneng", "pnsup", "POS", "WIKI", "WSS"
-    ]
-
     all_documents = []
-    for key in space_keys:
-        input_dir = os.path.join(docs_base_dir, key)
-        if not os.path.exists(input_dir):
-            print(f"Document subdirectory not found, skipping: {input_dir}")
-            continue
-        
-        print(f"Loading documents from: {input_dir}")
-        if not any(os.path.isfile(os.path.join(input_dir, f)) for f in os.listdir(input_dir)):
-            print(f"No files found in {input_dir}, skipping.")
-            continue
-            
-        try:
-            documents = SimpleDirectoryReader(input_dir).load_data()
-            all_documents.extend(documents)
-            print(f"Loaded {len(documents)} documents from {input_dir}.")
-        except Exception as e:
-            print(f"Error loading documents from {input_dir}: {e}")
+    for key in SPACE_KEYS:
+        all_documents.extend(load_space_documents(docs_base_dir, key))
 
     if not all_documents:
         raise ValueError(f"No documents found in any subdirectories of {docs_base_dir}. Cannot build vector store.")
 
     print(f"Total documents loaded: {len(all_documents)}. Building index...")
 
-    index = VectorStoreIndex.from_documents(all_documents)
+    index = VectorStoreIndex.from_documents(all_documents, transformations=index_transformations())
 
     print(f"Vector store index created. Persisting to: {vector_store_persist_dir}")
     if not os.path.exists(vector_store_persist_dir):
         os.makedirs(vector_store_persist_dir)
     index.storage_context.persist(persist_dir=vector_store_persist_dir)
     print("Vector store persisted successfully.")
+    if build_bm25:
+        build_bm25_index(index, vector_store_persist_dir)
     return index
\ No newline at end of file
@@ -3,43 +3,164 @@ from __future__ import annotations
 from models.chatbot_model import ChatBot
 from models.query_engine_model import QueryEngine
 from models.sql_processor_model import SQLProcessor
+from models.semantic_cache import SemanticCache
+from services.response_cache import ResponseCache
+from services.inference_executor import InferenceExecutor, default_intra_op_threads
+from models.model_worker_pool import ModelWorkerPool
+from services.vector_service import index_fingerprint
+from services.ann_index import AnnRetriever, build_or_load_ann_index
+from services.mmap_vector_store import MmapRetriever, build_or_load_mmap_vector_store
+from services.bm25_index import BM25_DIR_NAME, BM25Index, HybridRetriever
+from services.reranker import CachedCrossEncoderRerank
+from services.space_shards import SpaceShard, ShardedRetriever
 from config import settings
-from llama_index.core import VectorStoreIndex
+from llama_index.core import VectorStoreIndex, Settings as LlamaIndexSettings
+from llama_index.core.retrievers import BaseRetriever
+import os
 import torch
 
 _chatbot_instance: ChatBot | None = None
 _query_engine_instance: QueryEngine | None = None
 _vector_index_instance: VectorStoreIndex | None = None
 _sql_processor_instance: SQLProcessor | None = None
+_response_cache_instance: ResponseCache | None = None
+_inference_executor_instance: InferenceExecutor | None = None
 
-def init_dependencies(vector_index: VectorStoreIndex, app_settings: type(settings)):
-    global _query_engine_instance, _chatbot_instance, _vector_index_instance, _sql_processor_instance
+def _build_retriever(vector_index: VectorStoreIndex | None, app_settings: type(settings),
+                     space_shards: dict[str, SpaceShard] | None = None) -> BaseRetriever | None:
+    """Retriever for the configured space shards / VECTOR_INDEX_BACKEND / hybrid settings; None means the index default."""
+    # Nodes handed on to the reranker or near-duplicate removal, if any, else straight to the prompt
+    if app_settings.RERANK_ENABLED:
+        retrieval_top_k = app_settings.RERANK_CANDIDATES
+    elif app_settings.NEAR_DUPLICATE_DEDUP_ENABLED:
+        retrieval_top_k = app_settings.NEAR_DUPLICATE_CANDIDATES
+    else:
+        retrieval_top_k = app_settings.SIMILARITY_TOP_K
+    if space_shards is not None:
+        return ShardedRetriever(space_shards, similarity_top_k=retrieval_top_k, max_workers=app_settings.SPACE_SHARD_WORKERS)
+    # With hybrid retrieval the dense side returns extra candidates for the fusion to choose from
+    dense_top_k = max(app_settings.HYBRID_CANDIDATE_K, retrieval_top_k) if app_settings.HYBRID_RETRIEVAL_ENABLED else retrieval_top_k
+    node_lookup = vector_index.docstore.get_node if vector_index is not None else None
+
+    retriever = None
+    if app_settings.VECTOR_INDEX_BACKEND == "mmap":
+        mmap_store = build_or_load_mmap_vector_store(vector_index, app_settings.VECTOR_STORE_PATH, dtype=app_settings.MMAP_VECTOR_DTYPE)
+        retriever = MmapRetriever(mmap_store, similarity_top_k=dense_top_k)
+        node_lookup = mmap_store.node_by_id
+    elif app_settings.VECTOR_INDEX_BACKEND != "none":
+        ann_index = build_or_load_ann_index(
+            vector_index,
+            app_settings.VECTOR_STORE_PATH,
+            app_settings.VECTOR_INDEX_BACKEND,
+            hnsw_m=app_settings.ANN_HNSW_M,
+            ef_construction=app_settings.ANN_HNSW_EF_CONSTRUCTION,
+            nlist=app_settings.ANN_IVF_NLIST
+        )
+        ann_index.set_search_params(ef_search=app_settings.ANN_HNSW_EF_SEARCH, nprobe=app_settings.ANN_IVF_NPROBE)
+        retriever = AnnRetriever(ann_index, vector_index, similarity_top_k=dense_top_k)
+
+    if not app_settings.HYBRID_RETRIEVAL_ENABLED:
+        return retriever
+    return HybridRetriever(
+        retriever or vector_index.as_retriever(similarity_top_k=dense_top_k),
+        BM25Index(os.path.join(app_settings.VECTOR_STORE_PATH, BM25_DIR_NAME)),
+        node_lookup,
+        similarity_top_k=retrieval_top_k,
+        candidate_k=app_settings.HYBRID_CANDIDATE_K,
+        rrf_k=app_settings.HYBRID_RRF_K
+    )
+
+def init_dependencies(vector_index: VectorStoreIndex | None, app_settings: type(settings),
+                      space_shards: dict[str, SpaceShard] | None = None):
+    global _query_engine_instance, _chatbot_instance, _vector_index_instance, _sql_processor_instance, _response_cache_instance, _inference_executor_instance
     print("Initializing QueryEngine, ChatBot, and SQLProcessor instances...")
 
     _vector_index_instance = vector_index
 
-    _query_engine_instance = QueryEngine(index=_vector_index_instance, llm=None) # LLM for query engine can be configured if needed
+    _inference_executor_instance = InferenceExecutor(
+        workers=app_settings.INFERENCE_WORKERS,
+        intra_op_threads=app_settings.INFERENCE_INTRA_OP_THREADS,
+        inter_op_threads=app_settings.INFERENCE_INTER_OP_THREADS
+    )
+
+    _query_engine_instance = QueryEngine(
+        index=_vector_index_instance,
+        llm=None, # LLM for query engine can be configured if needed
+        index_version=index_fingerprint(app_settings.VECTOR_STORE_PATH),
+        similarity_top_k=app_settings.SIMILARITY_TOP_K,
+        retriever=_build_retriever(_vector_index_instance, app_settings, space_shards),
+        reranker=CachedCrossEncoderRerank(
+            model_name=app_settings.RERANK_MODEL_NAME,
+            # Near-duplicate removal needs the whole re-ranked list to backfill from
+            top_n=app_settings.RERANK_CANDIDATES if app_settings.NEAR_DUPLICATE_DEDUP_ENABLED else app_settings.SIMILARITY_TOP_K,
+            cache_size=app_settings.RERANK_CACHE_MAX_ENTRIES
+        ) if app_settings.RERANK_ENABLED else None,
+        rerank_candidates=app_settings.RERANK_CANDIDATES,
+        near_duplicate_distance=app_settings.NEAR_DUPLICATE_MAX_DISTANCE if app_settings.NEAR_DUPLICATE_DEDUP_ENABLED else None,
+        dedup_candidates=app_settings.NEAR_DUPLICATE_CANDIDATES
+    )
     print("QueryEngine instance initialized.")
 
 
+    semantic_cache = None
+    if app_settings.SEMANTIC_CACHE_ENABLED:
+        semantic_cache = SemanticCache(
+            embed_model=LlamaIndexSettings.embed_model,
+            threshold=app_settings.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=app_settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl_seconds=app_settings.SEMANTIC_CACHE_TTL_SECONDS
+        )
+
     torch_dtype = torch.float16
     if app_settings.MODEL_TORCH_DTYPE == "torch.float32":
         torch_dtype = torch.float32
 
-    _chatbot_instance = ChatBot(
-        query_engine=_query_engine_instance,
+    model_kwargs = dict(
         model_path=app_settings.MODEL_SAVE_PATH,
         device=app_settings.DEVICE,
         tokenizer_path=app_settings.MODEL_SAVE_PATH,
         model_torch_dtype=torch_dtype,
         max_new_tokens=app_settings.MAX_NEW_TOKENS,
-        temperature=app_settings.TEMPERATURE
+        temperature=app_settings.TEMPERATURE,
+        max_batch_size=app_settings.GENERATION_MAX_BATCH_SIZE,
+        batch_wait_ms=app_settings.GENERATION_BATCH_WAIT_MS,
+        use_prefix_cache=app_settings.PREFIX_CACHE_ENABLED,
+        quantization=app_settings.MODEL_QUANTIZATION,
+        draft_model_path=app_settings.DRAFT_MODEL_SAVE_PATH if app_settings.SPECULATIVE_DECODING_ENABLED else None,
+        backend=app_settings.MODEL_BACKEND
+    )
+
+    worker_pool = None
+    if app_settings.MODEL_WORKER_PROCESSES > 0:
+        worker_pool = ModelWorkerPool(
+            num_workers=app_settings.MODEL_WORKER_PROCESSES,
+            chatbot_kwargs=model_kwargs,
+            threads_per_worker=app_settings.MODEL_WORKER_THREADS or default_intra_op_threads(app_settings.MODEL_WORKER_PROCESSES)
+        )
+        # Batching happens inside each worker; the local model only serves streaming
+        model_kwargs.update(max_batch_size=1)
+
+    _chatbot_instance = ChatBot(
+        query_engine=_query_engine_instance,
+        semantic_cache=semantic_cache,
+        mmap_weights=app_settings.MODEL_MMAP_WEIGHTS or worker_pool is not None,
+        worker_pool=worker_pool,
+        inference_executor=_inference_executor_instance,
+        **model_kwargs
     )
     print("ChatBot instance initialized.")
 
-    _sql_processor_instance = SQLProcessor()
+    _sql_processor_instance = SQLProcessor(chatbot=_chatbot_instance)
     print("SQLProcessor instance initialized.")
 
+    if app_settings.RESPONSE_CACHE_ENABLED:
+        _response_cache_instance = ResponseCache(
+            max_entries=app_settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=app_settings.RESPONSE_CACHE_TTL_SECONDS,
+            sqlite_path=app_settings.RESPONSE_CACHE_SQLITE_PATH
+        )
+        print("ResponseCache instance initialized.")
+
 def get_chatbot() -> ChatBot:
     if _chatbot_instance is None:
         raise RuntimeError("ChatBot instance has not been initialized. Ensure startup event is configured and ran successfully.")
@@ -61,5 +182,14 @@ def get_sql_processor() -> SQLProcessor:
         raise RuntimeError("SQLProcessor instance has not been initialized.")
     return _sql_processor_instance
 
+def get_inference_executor() -> InferenceExecutor:
+    if _inference_executor_instance is None:
+        raise RuntimeError("InferenceExecutor instance has not been initialized.")
+    return _inference_executor_instance
+
+def get_response_cache() -> ResponseCache | None:
+    """FastAPI dependency for the exact-match response cache; None when disabled."""
+    return _response_cache_instance
+
 def get_chatbot_instance():
     return _chatbot_instance
\ No newline at end of file
@@ -0,0 +1,19 @@
+import asyncio
+from typing import Any, Awaitable
+
+from fastapi import Request
+
+from models.generation_control import GenerationControl
+
+
+async def cancel_on_disconnect(request: Request, control: GenerationControl, awaitable: Awaitable[Any],
+                               poll_interval: float = 0.25) -> Any:
+    """Awaits `awaitable`, cancelling `control` if the HTTP client disconnects meanwhile."""
+    task = asyncio.ensure_future(awaitable)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=poll_interval)
+        if done:
+            return task.result()
+        if not control.cancelled and await request.is_disconnected():
+            print("Client disconnected; cancelling generation.")
+            control.cancel()
@@ -1,13 +1,149 @@
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+import torch
 import os
+import glob
+import json
+import mmap
+import struct
+from typing import Dict
+from utils.quantization import load_or_quantize
 
-def download_model(model_name: str, save_path: str):
+MODEL_BACKENDS = ("transformers", "onnxruntime")
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+def download_model(model_name: str, save_path: str, export_onnx: bool = False):
     config_path = os.path.join(save_path, "config.json")
     if not os.path.exists(save_path) or not os.path.exists(config_path):
         print(f"Model not found at {save_path}. Downloading {model_name}...")
         os.makedirs(save_path, exist_ok=True)
-        AutoModelForCausalLM.from_pretrained(model_name).save_pretrained(save_path)
+        AutoModelForCausalLM.from_pretrained(model_name).save_pretrained(save_path, safe_serialization=True)
         AutoTokenizer.from_pretrained(model_name).save_pretrained(save_path)
         print(f"Model downloaded and saved to {save_path}")
     else:
-        print(f"Model already exists at {save_path}")
\ No newline at end of file
+        print(f"Model already exists at {save_path}")
+        if not glob.glob(os.path.join(save_path, "*.safetensors")):
+            print(f"Converting weights at {save_path} to safetensors...")
+            AutoModelForCausalLM.from_pretrained(save_path).save_pretrained(save_path, safe_serialization=True)
+    if export_onnx:
+        export_onnx_model(save_path)
+
+def onnx_model_path(model_path: str) -> str:
+    return f"{os.path.normpath(model_path)}-onnx"
+
+def export_onnx_model(model_path: str) -> str:
+    """Exports the model with Optimum next to `model_path` (once) and returns the export directory."""
+    from optimum.onnxruntime import ORTModelForCausalLM
+
+    onnx_path = onnx_model_path(model_path)
+    if os.path.exists(os.path.join(onnx_path, "config.json")):
+        print(f"ONNX export already exists at {onnx_path}")
+        return onnx_path
+
+    print(f"Exporting {model_path} to ONNX at {onnx_path}...")
+    ORTModelForCausalLM.from_pretrained(model_path, export=True, use_cache=True).save_pretrained(onnx_path)
+    print(f"ONNX model saved to {onnx_path}")
+    return onnx_path
+
+def _load_ort_causal_lm(model_path: str):
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForCausalLM
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session_options.intra_op_num_threads = torch.get_num_threads()
+    return ORTModelForCausalLM.from_pretrained(
+        export_onnx_model(model_path),
+        provider="CPUExecutionProvider",
+        session_options=session_options,
+        use_cache=True,
+    )
+
+def load_mmap_state_dict(model_path: str) -> Dict[str, torch.Tensor]:
+    """Tensors backed directly by memory-mapped safetensors files.
+
+    The files are mapped copy-on-write, so every process loading the same model shares the
+    weight pages through the page cache instead of holding its own copy.
+    """
+    state_dict = {}
+    for filename in sorted(glob.glob(os.path.join(model_path, "*.safetensors"))):
+        with open(filename, "rb") as f:
+            header_size = struct.unpack("<Q", f.read(8))[0]
+            header = json.loads(f.read(header_size))
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        data_start = 8 + header_size
+        for name, info in header.items():
+            if name == "__metadata__":
+                continue
+            dtype = SAFETENSORS_DTYPES[info["dtype"]]
+            start, end = info["data_offsets"]
+            if end == start:
+                tensor = torch.empty(0, dtype=dtype)
+            else:
+                tensor = torch.frombuffer(mapped, dtype=dtype, count=(end - start) // dtype.itemsize, offset=data_start + start)
+            state_dict[name] = tensor.view(info["shape"])
+
+    if not state_dict:
+        raise FileNotFoundError(f"No safetensors weights found in {model_path}.")
+    return state_dict
+
+def _load_mmap_causal_lm(model_path: str, torch_dtype: torch.dtype):
+    from accelerate import init_empty_weights
+
+    state_dict = load_mmap_state_dict(model_path)
+    saved_dtype = next(tensor.dtype for tensor in state_dict.values() if tensor.is_floating_point())
+    if saved_dtype != torch_dtype:
+        # Converting would copy every tensor out of the shared mapping
+        print(f"Memory-mapped weights are {saved_dtype}; ignoring requested dtype {torch_dtype}.")
+
+    config = AutoConfig.from_pretrained(model_path)
+    with init_empty_weights():
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=saved_dtype)
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+
+    unloaded = [name for name, param in model.named_parameters() if param.is_meta]
+    if unloaded:
+        raise ValueError(f"Weights missing from {model_path}: {unloaded[:5]}")
+    print(f"Loaded {len(state_dict)} memory-mapped tensors from {model_path}")
+    return model.eval()
+
+def load_causal_lm(model_path: str, device: str, torch_dtype: torch.dtype, quantization: str = "none",
+                   mmap_weights: bool = False, backend: str = "transformers"):
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unsupported model backend: {backend}. Expected one of {MODEL_BACKENDS}.")
+    if backend == "onnxruntime":
+        if device != "cpu" or quantization != "none" or mmap_weights:
+            raise ValueError("MODEL_BACKEND=onnxruntime requires DEVICE=cpu, no MODEL_QUANTIZATION and no mmap weights.")
+        return _load_ort_causal_lm(model_path)
+
+    if quantization != "none":
+        if device != "cpu":
+            raise ValueError(f"MODEL_QUANTIZATION={quantization} is only supported with DEVICE=cpu.")
+        if mmap_weights:
+            raise ValueError("Memory-mapped weights cannot be combined with MODEL_QUANTIZATION.")
+        # int8 quantization is applied on top of float32 weights
+        model = load_or_quantize(
+            model_path, quantization,
+            lambda: AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.float32)
+        )
+        return model.eval()
+
+    if mmap_weights:
+        if device != "cpu":
+            raise ValueError("Memory-mapped weights are only supported with DEVICE=cpu.")
+        return _load_mmap_causal_lm(model_path, torch_dtype)
+
+    model = AutoModelForCausalLM.from_pretrained(
+        model_path,
+        torch_dtype=torch_dtype,
+        device_map=device if device != "cpu" else None,
+    )
+    if device == "cpu" and (not hasattr(model, 'hf_device_map') or not model.hf_device_map):
+         model.to(torch.device("cpu"))
+    return model.eval()
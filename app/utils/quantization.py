@@ -0,0 +1,110 @@
+import hashlib
+import os
+from typing import Callable, Optional
+
+import torch
+import torch.nn.functional as F
+
+from services.derived_stores import derived_store_lock, replace_path, staging_path
+
+QUANTIZATION_MODES = ("none", "dynamic-int8", "weight-only-int8")
+
+
+class Int8WeightOnlyLinear(torch.nn.Module):
+    """Linear layer storing int8 weights with a per-output-channel scale.
+
+    Memory drops to roughly a quarter of float32. Where PyTorch has the CPU int8 weight-only
+    kernel (`torch._weight_int8pack_mm`, 2.3+) the matmul reads the int8 weights directly and
+    applies the scale to the output. Without it each forward converts the int8 weight to the
+    activation dtype, which saves memory only and decodes slower than float32.
+    """
+
+    def __init__(self, linear: torch.nn.Linear):
+        super().__init__()
+        weight = linear.weight.detach().float()
+        scale = weight.abs().amax(dim=1, keepdim=True).clamp(min=1e-8) / 127
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+        self.register_buffer("weight_int8", torch.round(weight / scale).to(torch.int8))
+        self.register_buffer("weight_scale", scale.to(torch.float32))
+        self.bias = None if linear.bias is None else torch.nn.Parameter(linear.bias.detach().clone(), requires_grad=False)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        scale = self.weight_scale.view(-1).to(x.dtype)
+        if int8_matmul_available() and x.device.type == "cpu":
+            rows = x.reshape(-1, self.in_features).contiguous()
+            output = torch._weight_int8pack_mm(rows, self.weight_int8, scale).reshape(*x.shape[:-1], self.out_features)
+        else:
+            # Scaling the output rather than the weight skips one full-size multiply per forward
+            output = F.linear(x, self.weight_int8.to(x.dtype)) * scale
+        return output if self.bias is None else output + self.bias
+
+
+def int8_matmul_available() -> bool:
+    """True when weight-only-int8 layers multiply against the int8 weights instead of dequantizing them."""
+    return hasattr(torch, "_weight_int8pack_mm")
+
+
+def _replace_linear_layers(module: torch.nn.Module):
+    for name, child in module.named_children():
+        # lm_head stays as is: it is usually tied to the (unquantized) embedding matrix
+        if isinstance(child, torch.nn.Linear) and name != "lm_head":
+            setattr(module, name, Int8WeightOnlyLinear(child))
+        else:
+            _replace_linear_layers(child)
+
+
+def quantize_model(model: torch.nn.Module, mode: str) -> torch.nn.Module:
+    if mode == "dynamic-int8":
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if mode == "weight-only-int8":
+        _replace_linear_layers(model)
+        return model
+    raise ValueError(f"Unsupported quantization mode: {mode}. Expected one of {QUANTIZATION_MODES}.")
+
+
+def quantized_artifact_path(model_path: str, mode: str) -> str:
+    return os.path.join(f"{os.path.normpath(model_path)}-{mode}", "model.pt")
+
+
+def source_fingerprint(model_path: str) -> str:
+    """Changes whenever the weights or config at `model_path` are replaced."""
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(model_path)):
+        path = os.path.join(model_path, name)
+        if os.path.isfile(path):
+            file_stat = os.stat(path)
+            digest.update(f"{name}:{file_stat.st_size}:{file_stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_or_quantize(model_path: str, mode: str, load_float_model: Callable[[], torch.nn.Module]) -> torch.nn.Module:
+    """Loads the cached quantized model for `mode`, quantizing and caching it when it is missing or was
+    quantized from different source weights."""
+    artifact_path = quantized_artifact_path(model_path, mode)
+    fingerprint_path = os.path.join(os.path.dirname(artifact_path), "source_fingerprint")
+    fingerprint = source_fingerprint(model_path)
+    with derived_store_lock(os.path.dirname(artifact_path)):
+        if os.path.exists(artifact_path) and _read_text(fingerprint_path) == fingerprint:
+            print(f"Loading {mode} quantized model from {artifact_path}")
+            return torch.load(artifact_path, weights_only=False)
+
+        print(f"Quantizing model from {model_path} with mode {mode}...")
+        model = quantize_model(load_float_model(), mode)
+        staging = staging_path(artifact_path)
+        torch.save(model, staging)
+        replace_path(staging, artifact_path)
+        # Written last: a matching fingerprint marks a complete artifact
+        staging = staging_path(fingerprint_path)
+        with open(staging, "w", encoding="utf-8") as f:
+            f.write(fingerprint)
+        replace_path(staging, fingerprint_path)
+        print(f"Quantized model saved to {artifact_path}")
+        return model
+
+
+def _read_text(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip()
@@ -0,0 +1,30 @@
+import atexit
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from config import settings
+
+# Records are handed to a background thread so request handlers never wait on disk I/O
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_listener = QueueListener(_queue, logging.FileHandler(settings.LOG_FILE_PATH, encoding="utf-8"))
+_listener.start()
+atexit.register(_listener.stop)
+
+_logger = logging.getLogger("chatbot.requests")
+_logger.setLevel(logging.INFO)
+_logger.propagate = False
+_logger.addHandler(QueueHandler(_queue))
+
+
+def log_request(endpoint: str, timings: dict, **fields):
+    """Writes one JSON line per request to LOG_FILE_PATH; `timings` is RequestTimings.as_dict()."""
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "endpoint": endpoint,
+        **fields,
+        **timings,
+    }
+    _logger.info(json.dumps(record, ensure_ascii=False, default=str))
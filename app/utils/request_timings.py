@@ -0,0 +1,51 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class RequestTimings:
+    """Per-request stage durations and token counts, filled in as the request moves through the pipeline.
+
+    Stages are accumulated in milliseconds under their name (retrieval, tokenization, prefill, decode, ...).
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.prompt_tokens: Optional[int] = None
+        self.generated_tokens: Optional[int] = None
+        # Prompt tokens of near-duplicate chunks kept out of the context (None when dedup is off)
+        self.dedup_tokens_saved: Optional[int] = None
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - start) * 1000)
+
+    def add(self, stage: str, elapsed_ms: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed_ms
+
+    def snapshot(self) -> dict:
+        """Picklable state, used to bring a model worker's timings back into the API process."""
+        return {"stages": dict(self.stages), "prompt_tokens": self.prompt_tokens, "generated_tokens": self.generated_tokens}
+
+    def merge(self, snapshot: dict):
+        for stage, elapsed_ms in snapshot["stages"].items():
+            self.add(stage, elapsed_ms)
+        self.prompt_tokens = snapshot["prompt_tokens"]
+        self.generated_tokens = snapshot["generated_tokens"]
+
+    def as_dict(self) -> dict:
+        timings = {f"{stage}_ms": round(elapsed_ms, 1) for stage, elapsed_ms in self.stages.items()}
+        timings["total_ms"] = round((time.perf_counter() - self.started_at) * 1000, 1)
+        timings["prompt_tokens"] = self.prompt_tokens
+        timings["generated_tokens"] = self.generated_tokens
+        timings["dedup_tokens_saved"] = self.dedup_tokens_saved
+        generation_ms = self.stages.get("prefill", 0.0) + self.stages.get("decode", 0.0)
+        timings["tokens_per_s"] = (
+            round(self.generated_tokens * 1000 / generation_ms, 2) if self.generated_tokens and generation_ms else None
+        )
+        return timings
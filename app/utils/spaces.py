@@ -0,0 +1,20 @@
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from models.query_engine_model import QueryEngine
+
+
+def validate_spaces(query_engine: QueryEngine, spaces: Optional[List[str]]):
+    """Rejects a `spaces` filter the query engine cannot apply with 422, before any work starts."""
+    if not spaces:
+        return
+    available = query_engine.available_spaces
+    if available is None:
+        raise HTTPException(status_code=422, detail="Filtering by space requires SPACE_SHARDS_ENABLED.")
+    unknown = [space for space in spaces if space not in available]
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown or empty spaces: {', '.join(unknown)}. Available: {', '.join(available)}"
+        )
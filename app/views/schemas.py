@@ -1,8 +1,15 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class Question(BaseModel):
     question: str
+    max_time: Optional[float] = Field(None, ge=0)  # seconds; overrides ASK_MAX_TIME_SECONDS, 0 disables
+    spaces: Optional[List[str]] = None  # space keys to search (needs SPACE_SHARDS_ENABLED); None searches all
+
+class BatchQuestion(BaseModel):
+    questions: List[str]
+    max_time: Optional[float] = Field(None, ge=0)  # seconds per question; overrides ASK_MAX_TIME_SECONDS, 0 disables
+    spaces: Optional[List[str]] = None  # applies to every question
 
 class SQLValidationDetail(BaseModel):
     type: str  # e.g., "syntax", "semantic"
@@ -12,6 +19,8 @@ class SQLGenerateRequest(BaseModel):
     prompt: str
     dialect: str = "sqlserver"
     perform_semantic_validation: bool = True
+    max_time: Optional[float] = Field(None, ge=0)  # seconds; overrides SQL_MAX_TIME_SECONDS, 0 disables
+    spaces: Optional[List[str]] = None  # space keys to search (needs SPACE_SHARDS_ENABLED); None searches all
 
 class SQLGenerateResponse(BaseModel):
     success: bool
@@ -19,12 +28,16 @@ class SQLGenerateResponse(BaseModel):
     generated_sql: Optional[str] = None
     formatted_sql: Optional[str] = None
     validation_errors: List[SQLValidationDetail] = []
+    truncated: bool = False
+    timings: Optional[dict] = None
 
 class SQLAlterRequest(BaseModel):
     original_sql: str
     alter_prompt: str
     dialect: str = "sqlserver"
     perform_semantic_validation: bool = True
+    max_time: Optional[float] = Field(None, ge=0)  # seconds; overrides SQL_MAX_TIME_SECONDS, 0 disables
+    spaces: Optional[List[str]] = None  # space keys to search (needs SPACE_SHARDS_ENABLED); None searches all
 
 class SQLAlterResponse(BaseModel):
     success: bool
@@ -32,6 +45,8 @@ class SQLAlterResponse(BaseModel):
     generated_sql: Optional[str] = None
     formatted_sql: Optional[str] = None
     validation_errors: List[SQLValidationDetail] = []
+    truncated: bool = False
+    timings: Optional[dict] = None
 
 class SQLValidateRequest(BaseModel):
     sql_script: str